@@ -0,0 +1,140 @@
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    metric_type = ''
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in sorted(values.items())]
+
+
+class Gauge(_Metric):
+    """
+    Gauge со значением, которое либо выставляется через set(), либо вычисляется при
+    каждом scrape функцией, переданной в set_function() (возвращает число или
+    словарь {кортеж значений меток: число}).
+    """
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self._function = None
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels))
+
+    def set_function(self, function):
+        self._function = function
+
+    def _samples(self):
+        if self._function is not None:
+            result = self._function()
+            values = result if isinstance(result, dict) else {(): result}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.setdefault(key, {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['buckets'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def _samples(self):
+        with self._lock:
+            values = {key: (list(state['buckets']), state['sum'], state['count']) for key, state in self._values.items()}
+        lines = []
+        for key, (bucket_counts, total, count) in sorted(values.items()):
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', _format_value(float(bound)))])} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    Набор метрик с выводом в текстовом формате Prometheus (без зависимости от prometheus_client).
+    """
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=()):
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
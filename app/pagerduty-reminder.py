@@ -1,13 +1,23 @@
-import requests
 import json
 import yaml
 import os
+import sys
 from datetime import datetime, timezone, timedelta
 import time
 import impconfig
 from pprint import pprint
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.http_client import HttpClient, HostRateLimiter
+from state_store import ProcessedIncidents, create_backend
+from scheduler import ReminderScheduler, parse_pd_time
+from webhook_server import ReminderHTTPServer, WebhookHandler
+from metrics import Registry
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -36,6 +46,15 @@ ACKNOWLEDGED_INCIDENT_THRESHOLD_HOURS = config.get('incident_thresholds', {}).ge
 
 EXCLUDED_SERVICES = config.get('excluded_services', [])
 
+# poll — опрос /incidents раз в 5 минут, webhook — приём событий PagerDuty и редкая сверка опросом
+RUN_MODE = config.get('mode', 'poll')
+POLL_INTERVAL_SECONDS = config.get('poll_interval_seconds', 300)
+WEBHOOK_CONFIG = config.get('webhook', {})
+# HTTP-сервер демона: webhook (в режиме webhook), /metrics и /healthz
+HTTP_PORT = config.get('http_port', 8080)
+METRICS_ENABLED = config.get('metrics', {}).get('enabled', True)
+HEALTHZ_MAX_LOOP_AGE_SECONDS = config.get('metrics', {}).get('healthz_max_loop_age_seconds', 300)
+
 # Проверка наличия токенов
 required_tokens = {
     "PAGERDUTY_API_TOKEN": PAGERDUTY_API_TOKEN,
@@ -45,16 +64,59 @@ required_tokens = {
 for token_name, token_value in required_tokens.items():
     if not token_value:
         raise ValueError(f"{token_name} отсутствует. Проверьте настройки или переменные окружения.")
+if RUN_MODE == 'webhook' and not WEBHOOK_CONFIG.get('secret'):
+    raise ValueError("В режиме webhook нужен webhook.secret: без проверки подписи события может прислать кто угодно.")
 
 # Логика работы с PagerDuty и Slack
-processed_incidents = {}
-last_clear_date = None
+# Состояние переживает рестарты пода, чтобы не дублировать напоминания после деплоя
+state_config = config.get('state', {})
+state_backend = create_backend(state_config)
+processed_incidents = ProcessedIncidents(
+    state_backend,
+    entry_ttl_seconds=state_config.get('entry_ttl_hours', 24) * 3600
+)
+stored_clear_date = state_backend.get_meta('last_clear_date')
+last_clear_date = datetime.strptime(stored_clear_date, '%Y-%m-%d').date() if stored_clear_date else None
 
 headers = {
     'Authorization': f'Token token={PAGERDUTY_API_TOKEN}',
     'Accept': 'application/vnd.pagerduty+json;version=2'
 }
 
+concurrency_config = config.get('concurrency', {})
+MAX_WORKERS = concurrency_config.get('max_workers', 8)
+rate_limiter = HostRateLimiter(concurrency_config.get('rate_limits', {
+    'api.pagerduty.com': 10,
+    'slack.com': 1,
+    'hooks.slack.com': 1
+}))
+http = HttpClient(timeout=10, pool_maxsize=MAX_WORKERS, rate_limiter=rate_limiter)
+
+metrics_registry = Registry()
+tick_duration = metrics_registry.histogram(
+    'reminder_tick_duration_seconds', 'Длительность итерации основного цикла (синхронизация и напоминания).'
+)
+api_request_duration = metrics_registry.histogram(
+    'reminder_api_request_duration_seconds', 'Задержка запросов к PagerDuty и Slack по эндпоинтам.', ('endpoint',)
+)
+api_requests_total = metrics_registry.counter(
+    'reminder_api_requests_total', 'Запросы к PagerDuty и Slack по эндпоинтам и HTTP-кодам (error — сетевая ошибка).', ('endpoint', 'status')
+)
+reminders_sent_total = metrics_registry.counter('reminder_reminders_sent_total', 'Отправленные напоминания в Slack.')
+reminders_skipped_total = metrics_registry.counter(
+    'reminder_reminders_skipped_total', 'Инциденты, по которым напоминание не отправлено, по причинам.', ('reason',)
+)
+reminders_excluded_total = metrics_registry.counter(
+    'reminder_reminders_excluded_total', 'Инциденты исключённых сервисов или не high urgency.'
+)
+last_loop_timestamp = metrics_registry.gauge('reminder_last_loop_timestamp_seconds', 'Unix-время последней итерации основного цикла.')
+
+def observe_api_request(endpoint, elapsed, status):
+    api_request_duration.observe(elapsed, endpoint=endpoint)
+    api_requests_total.inc(endpoint=endpoint, status=status if status is not None else 'error')
+
+http.listeners.append(observe_api_request)
+
 def is_within_working_hours() -> bool:
     """
     Проверяет, находится ли текущее время в интервале с 7:00 до 14:00 по UTC и является ли день рабочим (понедельник - пятница).
@@ -82,7 +144,7 @@ def send_to_slack(message):
     }
 
     try:
-        response = requests.post(url, json=payload, headers=headers, timeout=10)
+        response = http.post(url, json=payload, headers=headers)
         response_data = response.json()
         if response_data.get("ok"):
             return response_data.get("ts")  # thread_ts
@@ -107,28 +169,126 @@ def send_to_slack_thread(message, thread_ts):
         'thread_ts': thread_ts  # Указываем thread_ts для отправки в тред
     }
     try:
-        response = requests.post(SLACK_WEBHOOK_URL, data=json.dumps(payload), headers={'Content-Type': 'application/json'}, timeout=10)
+        response = http.post(SLACK_WEBHOOK_URL, data=json.dumps(payload), headers={'Content-Type': 'application/json'})
         response.raise_for_status()
     except Exception as e:
         logger.error(f'Ошибка отправки в Slack: {e}')
 
-def get_high_urgency_incidents():
-    params = {
-        'urgency': 'high',
-        'statuses[]': ['triggered', 'acknowledged'],
-        'limit': 100
-    }
-    try:
-        response = requests.get(f"{PAGERDUTY_BASE_URL}/incidents", headers=headers, params=params, timeout=10)
+class IncidentFetcher:
+    """
+    Инкрементальная выборка открытых high-urgency инцидентов.
+
+    Первый вызов (и периодическая полная ресинхронизация) постранично выкачивает
+    все открытые инциденты. Последующие вызовы запрашивают только изменения с момента
+    последнего watermark через /log_entries и обновляют таблицу инцидентов в памяти.
+    """
+    OPEN_STATUSES = ('triggered', 'acknowledged')
+
+    def __init__(self, full_resync_minutes=60, page_limit=100, overlap_seconds=60):
+        self.incidents = {}
+        self.watermark = None
+        self.last_full_sync = None
+        self.full_resync_interval = timedelta(minutes=full_resync_minutes)
+        self.page_limit = page_limit
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._lock = threading.Lock()
+
+    def _paginate(self, path, params, key):
+        """
+        Проходит по всем страницам ответа PagerDuty (offset/limit + флаг more).
+        """
+        offset = 0
+        while True:
+            page_params = dict(params, offset=offset, limit=self.page_limit)
+            response = http.get(f"{PAGERDUTY_BASE_URL}/{path}", headers=headers, params=page_params)
+            response.raise_for_status()
+            data = response.json()
+            yield from data.get(key, [])
+            if not data.get('more'):
+                break
+            offset += self.page_limit
+
+    def _is_tracked(self, incident):
+        return incident.get('urgency') == 'high' and incident.get('status') in self.OPEN_STATUSES
+
+    def get_incident(self, incident_id):
+        response = http.get(f"{PAGERDUTY_BASE_URL}/incidents/{incident_id}", headers=headers)
         response.raise_for_status()
-        return response.json().get('incidents', [])
-    except Exception as e:
-        logger.error(f"Ошибка при запросе инцидентов: {e}")
-        return []
+        return response.json().get('incident', {})
+
+    def _full_sync(self, now):
+        params = {
+            'urgency': 'high',
+            'statuses[]': list(self.OPEN_STATUSES)
+        }
+        incidents = {incident['id']: incident for incident in self._paginate('incidents', params, 'incidents')}
+        with self._lock:
+            self.incidents = incidents
+        self.last_full_sync = now
+        logger.info(f"Полная синхронизация инцидентов: {len(self.incidents)} открытых.")
+
+    def _incremental_sync(self, now):
+        params = {
+            'since': (self.watermark - self.overlap).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'until': now.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'is_overview': 'true',
+            'include[]': 'incidents'
+        }
+        changed = {}
+        for entry in self._paginate('log_entries', params, 'log_entries'):
+            incident = entry.get('incident') or {}
+            if incident.get('id'):
+                changed[incident['id']] = incident
+
+        for incident_id, incident in changed.items():
+            # Без include[] в записи лога приходит только ссылка на инцидент
+            if 'status' not in incident:
+                incident = self.get_incident(incident_id)
+            self.apply(incident)
+        if changed:
+            logger.info(f"Инкрементальная синхронизация: изменено {len(changed)}, открытых {len(self.incidents)}.")
+
+    def apply(self, incident) -> bool:
+        """
+        Обновляет инцидент в таблице (из лога изменений или webhook). Возвращает True,
+        если инцидент остаётся открытым high-urgency.
+        """
+        tracked = self._is_tracked(incident)
+        with self._lock:
+            if tracked:
+                self.incidents[incident['id']] = incident
+            else:
+                self.incidents.pop(incident['id'], None)
+        return tracked
+
+    def refresh(self):
+        """
+        Обновляет таблицу инцидентов и возвращает список открытых high-urgency инцидентов.
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            if self.watermark is None or now - self.last_full_sync >= self.full_resync_interval:
+                self._full_sync(now)
+            else:
+                self._incremental_sync(now)
+            self.watermark = now
+        except Exception as e:
+            # watermark не сдвигаем — изменения будут запрошены повторно на следующем тике
+            logger.error(f"Ошибка при запросе инцидентов: {e}")
+        with self._lock:
+            return list(self.incidents.values())
+
+incident_fetcher = IncidentFetcher(
+    full_resync_minutes=config.get('fetch', {}).get('full_resync_minutes', 60),
+    page_limit=config.get('fetch', {}).get('page_limit', 100)
+)
+
+def get_high_urgency_incidents():
+    return incident_fetcher.refresh()
 
 def check_incident_times(incident):
     now = datetime.now(timezone.utc)
-    created_at = datetime.strptime(incident['created_at'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+    created_at = parse_pd_time(incident['created_at'])
     status = incident['status']
 
     if status == 'triggered' and now - created_at > timedelta(minutes=TRIGGERED_INCIDENT_THRESHOLD_MINUTES):
@@ -137,24 +297,127 @@ def check_incident_times(incident):
         return (True, 'acknowledged', now - created_at)
     return (False, '', timedelta(0))
 
+class TTLCache:
+    """
+    Кэш с временем жизни записей и вытеснением давно неиспользуемых (LRU) при переполнении.
+    Поддерживает отдельный TTL для отрицательных результатов ("не найдено").
+    """
+    def __init__(self, name, ttl_seconds, max_size=1024, negative_ttl_seconds=None):
+        self.name = name
+        self.ttl = ttl_seconds
+        self.negative_ttl = ttl_seconds if negative_ttl_seconds is None else negative_ttl_seconds
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Возвращает (True, значение) при попадании и (False, None) при промахе или устаревшей записи.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, negative=False):
+        ttl = self.negative_ttl if negative else self.ttl
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0
+        }
+
+cache_config = config.get('cache', {})
+escalation_policy_cache = TTLCache(
+    'service_escalation_policy',
+    ttl_seconds=cache_config.get('service_ttl_seconds', 3600),
+    max_size=cache_config.get('max_size', 1024)
+)
+user_email_cache = TTLCache(
+    'user_email',
+    ttl_seconds=cache_config.get('email_ttl_seconds', 86400),
+    max_size=cache_config.get('max_size', 1024)
+)
+slack_mention_cache = TTLCache(
+    'slack_mention',
+    ttl_seconds=cache_config.get('slack_ttl_seconds', 86400),
+    max_size=cache_config.get('max_size', 1024),
+    negative_ttl_seconds=cache_config.get('slack_negative_ttl_seconds', 3600)
+)
+
+CACHES = (escalation_policy_cache, user_email_cache, slack_mention_cache)
+
+def log_cache_stats():
+    for cache in CACHES:
+        logger.info(f"Кэш {cache.name}: {cache.stats()}")
+
+for stat in ('hits', 'misses', 'size', 'hit_ratio'):
+    metrics_registry.gauge(f'reminder_cache_{stat}', f'Кэш lookup-цепочки: {stat}.', ('cache',)).set_function(
+        lambda stat=stat: {(cache.name,): cache.stats()[stat] for cache in CACHES}
+    )
+
+def get_escalation_policy_id(service_id):
+    """
+    Получает ID политики эскалации сервиса (с кэшированием).
+    """
+    found, escalation_policy_id = escalation_policy_cache.get(service_id)
+    if found:
+        return escalation_policy_id
+
+    url = f"{PAGERDUTY_BASE_URL}/services/{service_id}"
+    response = http.get(url, headers=headers)
+    response.raise_for_status()
+    escalation_policy_id = response.json().get("service", {}).get("escalation_policy", {}).get("id")
+    escalation_policy_cache.set(service_id, escalation_policy_id, negative=not escalation_policy_id)
+    return escalation_policy_id
+
 def get_user_email(user_id: str) -> str:
     """
-    Получает email пользователя по его ID.
+    Получает email пользователя по его ID (с кэшированием).
     """
+    found, email = user_email_cache.get(user_id)
+    if found:
+        return email
+
     url = f'{PAGERDUTY_BASE_URL}/users/{user_id}'
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = http.get(url, headers=headers)
         response.raise_for_status()
         user_data = response.json().get('user', {})
-        return user_data.get('email', 'Неизвестный email')
+        email = user_data.get('email')
+        if not email:
+            return 'Неизвестный email'
+        user_email_cache.set(user_id, email)
+        return email
     except Exception as e:
         logger.error(f"Ошибка получения данных пользователя из PagerDuty: {e}")
         return 'Неизвестный email'
 
 def get_slack_user_id_by_email(email: str) -> str:
     """
-    Получает Slack ID пользователя по его email.
+    Получает Slack ID пользователя по его email (с кэшированием, включая "не найден").
     """
+    found, mention = slack_mention_cache.get(email)
+    if found:
+        return mention
+
     url = "https://slack.com/api/users.lookupByEmail"
     headers = {
         'Authorization': f'Bearer {SLACK_BOT_TOKEN}',
@@ -162,13 +425,18 @@ def get_slack_user_id_by_email(email: str) -> str:
     }
     data = {'email': email}
     try:
-        response = requests.post(url, headers=headers, data=data, timeout=10)
+        response = http.post(url, headers=headers, data=data)
         response.raise_for_status()
         if not response.json().get("ok"):
             logger.warning(f"Не удалось найти Slack ID для email {email}: {response.text}")
+            # Отрицательный результат кэшируем на более короткий срок
+            if response.json().get("error") == "users_not_found":
+                slack_mention_cache.set(email, email, negative=True)
             return email
         user = response.json().get("user", {})
-        return f"<@{user['id']}>"
+        mention = f"<@{user['id']}>"
+        slack_mention_cache.set(email, mention)
+        return mention
     except Exception as e:
         logger.error(f"Ошибка получения Slack ID для {email}: {e}")
         return email
@@ -177,17 +445,14 @@ def get_on_call_users_for_service(service_id):
     """
     Получает список дежурных пользователей для указанного сервиса, включая их email и Slack-упоминания.
     """
-    url = f"{PAGERDUTY_BASE_URL}/services/{service_id}"
     try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        escalation_policy_id = response.json().get("service", {}).get("escalation_policy", {}).get("id")
+        escalation_policy_id = get_escalation_policy_id(service_id)
         if not escalation_policy_id:
             return []
 
         url_oncalls = f"{PAGERDUTY_BASE_URL}/oncalls"
         params = {"escalation_policy_ids[]": escalation_policy_id}
-        response = requests.get(url_oncalls, headers=headers, params=params, timeout=10)
+        response = http.get(url_oncalls, headers=headers, params=params)
         response.raise_for_status()
         on_calls = response.json().get("oncalls", [])
 
@@ -212,7 +477,14 @@ def clear_processed_incidents():
         if last_clear_date != now.date():
             processed_incidents.clear()
             last_clear_date = now.date()
+            state_backend.set_meta('last_clear_date', last_clear_date.isoformat())
             logger.info("Сброс обработанных инцидентов в 7:00 UTC.")
+            return True
+    else:
+        expired = processed_incidents.compact()
+        if expired:
+            logger.info(f"Удалено {expired} просроченных записей из processed_incidents.")
+    return False
 
 def has_pending_actions(incident):
     """
@@ -225,8 +497,34 @@ def has_pending_actions(incident):
     except KeyError:
         return False
 
-def check_incidents():
-    incidents = get_high_urgency_incidents()
+def prepare_reminder(incident):
+    """
+    Готовит текст напоминания по инциденту. Возвращает (message, reminder_message)
+    или None, если инцидент ещё не превысил порог. Выполняется в пуле потоков.
+    """
+    check, status, time_passed = check_incident_times(incident)
+    if not check:
+        return None
+
+    service_name = incident['service']['summary']
+    # Получаем дежурных пользователей
+    on_call_users = get_on_call_users_for_service(incident['service']['id'])
+    on_call_users_mentions = ", ".join([user['slack_mention'] for user in on_call_users]) or "никого нет"
+
+    time_str = str(time_passed).split('.')[0]
+    incident_url = incident['html_url']
+    message = (f"Привет {on_call_users_mentions}, я вижу, что <{incident_url}|{incident['summary']}> (Impacted Service: {service_name}) "
+               f"уже висит более {time_str} в статусе {status}. "
+               "Подскажите, ведутся ли по нему работы?")
+    reminder_message = (f"Если ведутся работы, чтобы мы не писали тебе во время выполнения работ, установи snooze time "
+                        f"в <{incident_url}|{incident['summary']}> на планируемое время работ.")
+    return message, reminder_message
+
+def process_incidents(incidents):
+    """
+    Отбирает инциденты для напоминания, готовит сообщения и отправляет их в Slack.
+    """
+    candidates = []
     for incident in incidents:
         service_name = incident['service']['summary']
         urgency = incident['urgency']
@@ -234,47 +532,153 @@ def check_incidents():
 
         # Пропускаем инциденты
         if service_name in EXCLUDED_SERVICES or urgency != 'high':
+            reminders_excluded_total.inc()
             continue
 
         if incident_id in processed_incidents:
+            reminders_skipped_total.inc(reason='processed')
             continue
 
         # Проверка на pending actions перед отправкой сообщения
         if has_pending_actions(incident):
+            reminders_skipped_total.inc(reason='pending_actions')
             processed_incidents[incident_id] = datetime.now(timezone.utc)
             logger.info(f"Инцидент {incident_id} имеет pending actions и был добавлен в processed_incidents.")
             continue  # Пропускаем отправку сообщения, если есть pending actions
 
-        # Получаем дежурных пользователей
-        on_call_users = get_on_call_users_for_service(incident['service']['id'])
-        on_call_users_mentions = ", ".join([user['slack_mention'] for user in on_call_users]) or "никого нет"
-
-        check, status, time_passed = check_incident_times(incident)
-        if check:
-            time_str = str(time_passed).split('.')[0]
-            incident_url = incident['html_url']
-            message = (f"Привет {on_call_users_mentions}, я вижу, что <{incident_url}|{incident['summary']}> (Impacted Service: {service_name}) "
-                       f"уже висит более {time_str} в статусе {status}. "
-                       "Подскажите, ведутся ли по нему работы?")
-
-            # Отправляем основное сообщение и получаем thread_ts
-            thread_ts = send_to_slack(message)
-            if thread_ts:
-                # Отправляем второе сообщение в тред
-                reminder_message = (f"Если ведутся работы, чтобы мы не писали тебе во время выполнения работ, установи snooze time "
-                                   f"в <{incident_url}|{incident['summary']}> на планируемое время работ.")
-                send_to_slack_thread(reminder_message, thread_ts)
+        candidates.append(incident)
 
-            processed_incidents[incident_id] = datetime.now(timezone.utc)
+    # Запросы к PagerDuty/Slack по инцидентам выполняются параллельно,
+    # а сообщения отправляются последовательно в порядке создания инцидентов
+    candidates.sort(key=lambda incident: (incident['created_at'], incident['id']))
+    if MAX_WORKERS > 1 and len(candidates) > 1:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            reminders = list(executor.map(prepare_reminder, candidates))
+    else:
+        reminders = [prepare_reminder(incident) for incident in candidates]
+
+    for incident, reminder in zip(candidates, reminders):
+        if reminder is None:
+            reminders_skipped_total.inc(reason='not_due')
+            continue
+        message, reminder_message = reminder
+
+        # Отправляем основное сообщение и получаем thread_ts
+        thread_ts = send_to_slack(message)
+        if thread_ts:
+            reminders_sent_total.inc()
+            # Отправляем второе сообщение в тред
+            send_to_slack_thread(reminder_message, thread_ts)
+
+        processed_incidents[incident['id']] = datetime.now(timezone.utc)
+
+reminder_scheduler = ReminderScheduler({
+    'triggered': timedelta(minutes=TRIGGERED_INCIDENT_THRESHOLD_MINUTES),
+    'acknowledged': timedelta(hours=ACKNOWLEDGED_INCIDENT_THRESHOLD_HOURS)
+})
+metrics_registry.gauge('reminder_processed_incidents', 'Размер processed_incidents.').set_function(lambda: len(processed_incidents))
+metrics_registry.gauge('reminder_scheduled_incidents', 'Инциденты в очереди дедлайнов.').set_function(lambda: len(reminder_scheduler))
+metrics_registry.gauge('reminder_open_incidents', 'Открытые high-urgency инциденты в таблице.').set_function(lambda: len(incident_fetcher.incidents))
+
+def handle_webhook_event(event_type, incident):
+    """
+    Применяет событие webhook к таблице инцидентов и очереди дедлайнов.
+    """
+    incident_id = incident['id']
+    logger.info(f"Webhook {event_type} по инциденту {incident_id}.")
+    if event_type == 'incident.snoozed':
+        # Как и при pending actions: по отложенному инциденту не напоминаем
+        incident_fetcher.apply(incident)
+        reminder_scheduler.remove(incident_id)
+        processed_incidents[incident_id] = datetime.now(timezone.utc)
+        return
+    if incident_fetcher.apply(incident):
+        reminder_scheduler.update(incident)
+    else:
+        reminder_scheduler.remove(incident_id)
+
+def remind_due_incidents():
+    """
+    Отправляет напоминания по инцидентам, чей дедлайн наступил. Перед отправкой инцидент
+    перечитывается из PagerDuty: между опросами он мог измениться, а в событии webhook
+    нет pending_actions.
+    """
+    incidents = []
+    for incident_id in reminder_scheduler.pop_due():
+        if incident_id in processed_incidents:
+            continue
+        try:
+            incident = incident_fetcher.get_incident(incident_id)
+        except Exception as e:
+            logger.error(f"Ошибка при запросе инцидента {incident_id}: {e}")
+            reminder_scheduler.rearm([incident_id])  # повторим после следующей синхронизации
+            continue
+        if incident_fetcher.apply(incident):
+            incidents.append(incident)
+    if incidents:
+        process_incidents(incidents)
+
+def run_scheduler_loop(sync_interval_seconds):
+    """
+    Основной цикл: раз в sync_interval_seconds сверяет очередь дедлайнов с PagerDuty,
+    а между сверками спит ровно до ближайшего дедлайна.
+    """
+    next_sync = 0
+    while True:
+        started = time.monotonic()
+        if clear_processed_incidents():
+            reminder_scheduler.rearm()
+            next_sync = 0  # вернуть в очередь инциденты, по которым уже напоминали
+        if time.monotonic() >= next_sync:
+            reminder_scheduler.sync(get_high_urgency_incidents())
+            next_sync = time.monotonic() + sync_interval_seconds
+            log_cache_stats()
+            http.log_metrics()
+        remind_due_incidents()
+        tick_duration.observe(time.monotonic() - started)
+        last_loop_timestamp.set(time.time())
+
+        # Спим до ближайшего дедлайна, но не дольше минуты (проверка сброса в 7:00)
+        timeout = min(60, next_sync - time.monotonic())
+        next_deadline = reminder_scheduler.next_deadline()
+        if next_deadline:
+            timeout = min(timeout, (next_deadline - datetime.now(timezone.utc)).total_seconds())
+        reminder_scheduler.wait(timeout)
+
+def metrics_endpoint(body, headers):
+    return 200, 'text/plain; version=0.0.4; charset=utf-8', metrics_registry.render().encode()
+
+def healthz_endpoint(body, headers):
+    """
+    Живость: основной цикл должен проходить итерацию не реже раза в минуту.
+    """
+    last_loop = last_loop_timestamp.get()
+    if last_loop is None or time.time() - last_loop > HEALTHZ_MAX_LOOP_AGE_SECONDS:
+        return 503, 'text/plain', b'main loop stalled'
+    return 200, 'text/plain', b'ok'
+
+def start_http_server():
+    if RUN_MODE != 'webhook' and not METRICS_ENABLED:
+        return None
+    server = ReminderHTTPServer(HTTP_PORT)
+    if RUN_MODE == 'webhook':
+        server.add_route('POST', WEBHOOK_CONFIG.get('path', '/webhooks/pagerduty'),
+                         WebhookHandler(on_event=handle_webhook_event, secret=WEBHOOK_CONFIG.get('secret')))
+    if METRICS_ENABLED:
+        server.add_route('GET', '/metrics', metrics_endpoint)
+        server.add_route('GET', '/healthz', healthz_endpoint)
+    server.start()
+    return server
 
 if __name__ == '__main__':
     try:
-        logger.info("Скрипт запущен.")
-        while True:
-            clear_processed_incidents()  # Сбрасываем обработанные инциденты, если пришло время
-            check_incidents()           # Проверяем инциденты
-            time.sleep(300)             # Ждём 5 минут перед следующей проверкой
+        logger.info(f"Скрипт запущен в режиме {RUN_MODE}.")
+        start_http_server()
+        if RUN_MODE == 'webhook':
+            run_scheduler_loop(WEBHOOK_CONFIG.get('reconcile_minutes', 30) * 60)
+        else:
+            run_scheduler_loop(POLL_INTERVAL_SECONDS)
     except KeyboardInterrupt:
         logger.info("Скрипт завершён вручную.")
     except Exception as e:
-        logger.exception(f'Необработанное исключение: {e}')
\ No newline at end of file
+        logger.exception(f'Необработанное исключение: {e}')
@@ -0,0 +1,124 @@
+import heapq
+import itertools
+import threading
+from datetime import datetime, timezone
+
+
+def parse_pd_time(value) -> datetime:
+    """
+    Разбирает время PagerDuty (ISO 8601 с Z или смещением) в aware datetime в UTC.
+    """
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).astimezone(timezone.utc)
+
+
+class ReminderScheduler:
+    """
+    Очередь дедлайнов напоминаний по инцидентам (min-heap).
+
+    Дедлайн считается один раз при появлении инцидента: created_at + порог для его статуса.
+    При смене статуса инцидент перекладывается в очереди (старая запись становится
+    неактуальной и отбрасывается при извлечении). Сработавший дедлайн запоминается
+    и повторно не ставится, пока не сменится статус или не будет вызван rearm().
+    Извлечение due-инцидентов стоит O(k log n), где k — количество сработавших дедлайнов.
+    """
+    def __init__(self, thresholds: dict):
+        # status -> timedelta от created_at
+        self.thresholds = thresholds
+        self._heap = []
+        self._scheduled = {}  # incident_id -> (deadline, status, created_at)
+        self._fired = {}  # incident_id -> (status, created_at) сработавшего дедлайна
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def update(self, incident) -> bool:
+        """
+        Ставит или перекладывает инцидент в очереди по его текущему статусу.
+        Инциденты со статусом без порога (resolved и т.п.) из очереди убираются.
+        """
+        incident_id = incident['id']
+        status = incident.get('status')
+        threshold = self.thresholds.get(status)
+        with self._condition:
+            if threshold is None:
+                self._fired.pop(incident_id, None)
+                return self._scheduled.pop(incident_id, None) is not None
+            key = (status, incident['created_at'])
+            current = self._scheduled.get(incident_id)
+            if (current is not None and current[1:] == key) or self._fired.get(incident_id) == key:
+                return False
+            self._fired.pop(incident_id, None)
+            deadline = parse_pd_time(incident['created_at']) + threshold
+            self._scheduled[incident_id] = (deadline,) + key
+            heapq.heappush(self._heap, (deadline, next(self._counter), incident_id))
+            # Будим цикл планировщика: новый дедлайн может оказаться ближайшим
+            self._condition.notify_all()
+            return True
+
+    def remove(self, incident_id):
+        with self._condition:
+            self._scheduled.pop(incident_id, None)
+            self._fired.pop(incident_id, None)
+
+    def rearm(self, incident_ids=None):
+        """
+        Забывает сработавшие дедлайны (все или указанные), чтобы следующий update/sync
+        поставил инциденты в очередь заново.
+        """
+        with self._condition:
+            if incident_ids is None:
+                self._fired.clear()
+            else:
+                for incident_id in incident_ids:
+                    self._fired.pop(incident_id, None)
+
+    def sync(self, incidents):
+        """
+        Приводит очередь к полному списку открытых инцидентов (сверка с опросом PagerDuty).
+        """
+        incidents = list(incidents)
+        open_ids = {incident['id'] for incident in incidents}
+        with self._condition:
+            for table in (self._scheduled, self._fired):
+                for incident_id in list(table):
+                    if incident_id not in open_ids:
+                        del table[incident_id]
+        for incident in incidents:
+            self.update(incident)
+
+    def _drop_stale_head(self):
+        while self._heap:
+            deadline, _, incident_id = self._heap[0]
+            current = self._scheduled.get(incident_id)
+            if current is not None and current[0] == deadline:
+                return
+            heapq.heappop(self._heap)
+
+    def pop_due(self, now=None) -> list:
+        """
+        Извлекает ID инцидентов, чей дедлайн наступил, в порядке дедлайнов.
+        """
+        now = now or datetime.now(timezone.utc)
+        due = []
+        with self._condition:
+            self._drop_stale_head()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, incident_id = heapq.heappop(self._heap)
+                self._fired[incident_id] = self._scheduled.pop(incident_id)[1:]
+                due.append(incident_id)
+                self._drop_stale_head()
+        return due
+
+    def next_deadline(self):
+        with self._condition:
+            self._drop_stale_head()
+            return self._heap[0][0] if self._heap else None
+
+    def wait(self, timeout):
+        """
+        Спит до timeout секунд или до появления более раннего дедлайна.
+        """
+        with self._condition:
+            self._condition.wait(timeout=max(0.0, timeout))
+
+    def __len__(self):
+        return len(self._scheduled)
@@ -0,0 +1,278 @@
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteBackend:
+    """
+    Хранилище состояния в локальном SQLite (по умолчанию). Каждая запись — отдельная транзакция,
+    поэтому после рестарта пода состояние не теряется и не бывает полузаписанным.
+    """
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+
+    def load_entries(self, now) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, value, expires_at FROM entries WHERE expires_at > ?", (now,)).fetchall()
+        return {key: (value, expires_at) for key, value, expires_at in rows}
+
+    def put(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)", (key, value, expires_at))
+
+    def delete_all(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+
+    def compact(self, now):
+        with self._lock:
+            deleted = self._conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+        return deleted
+
+    def get_meta(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+
+class FileBackend:
+    """
+    Хранилище состояния в JSON-файле. Файл перезаписывается атомарно: запись во временный
+    файл в том же каталоге и os.replace поверх старого.
+    """
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._data = {'entries': {}, 'meta': {}}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='UTF-8') as file:
+                    self._data = json.load(file)
+            except (OSError, ValueError) as e:
+                logger.error(f"Не удалось прочитать состояние из {path}: {e}")
+
+    def _flush(self):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path) or '.', prefix='.state-')
+        try:
+            with os.fdopen(fd, 'w', encoding='UTF-8') as file:
+                json.dump(self._data, file)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def load_entries(self, now) -> dict:
+        with self._lock:
+            return {key: tuple(entry) for key, entry in self._data['entries'].items() if entry[1] > now}
+
+    def put(self, key, value, expires_at):
+        with self._lock:
+            self._data['entries'][key] = [value, expires_at]
+            self._flush()
+
+    def delete_all(self):
+        with self._lock:
+            self._data['entries'] = {}
+            self._flush()
+
+    def compact(self, now):
+        with self._lock:
+            expired = [key for key, entry in self._data['entries'].items() if entry[1] <= now]
+            for key in expired:
+                del self._data['entries'][key]
+            if expired:
+                self._flush()
+        return len(expired)
+
+    def get_meta(self, name):
+        with self._lock:
+            return self._data['meta'].get(name)
+
+    def set_meta(self, name, value):
+        with self._lock:
+            self._data['meta'][name] = value
+            self._flush()
+
+
+class LocalRedis:
+    """
+    Локальная замена Redis в памяти с подмножеством API redis-py (get/set с ex/delete/scan_iter).
+    Нужна для запуска без Redis и для отладки.
+    """
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _alive(self, key, now):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] is not None and entry[1] <= now:
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._alive(key, time.time())
+            return entry[0] if entry else None
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            self._data[key] = (value, time.time() + ex if ex else None)
+        return True
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match=None):
+        prefix = match.rstrip('*') if match else ''
+        now = time.time()
+        with self._lock:
+            # _alive удаляет просроченные ключи, поэтому обход идёт по копии
+            keys = [key for key in list(self._data) if key.startswith(prefix) and self._alive(key, now)]
+        return iter(keys)
+
+    def purge_expired(self, now):
+        """Удаляет просроченные ключи, которые больше не читались; возвращает их число."""
+        with self._lock:
+            return sum(self._alive(key, now) is None for key in list(self._data))
+
+
+class RedisBackend:
+    """
+    Хранилище состояния в Redis (или совместимом клиенте). Срок жизни записей задаётся
+    нативным TTL ключей, поэтому compaction нужна только LocalRedis: он удаляет просроченные
+    ключи лишь при обращении к ним.
+    """
+    def __init__(self, client, prefix='pagerduty-reminder'):
+        self.client = client
+        self.entry_prefix = f"{prefix}:entry:"
+        self.meta_prefix = f"{prefix}:meta:"
+
+    @staticmethod
+    def _decode(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    def load_entries(self, now) -> dict:
+        entries = {}
+        for raw_key in self.client.scan_iter(match=f"{self.entry_prefix}*"):
+            raw_value = self.client.get(raw_key)
+            if raw_value is None:
+                continue
+            value, expires_at = json.loads(self._decode(raw_value))
+            if expires_at > now:
+                entries[self._decode(raw_key)[len(self.entry_prefix):]] = (value, expires_at)
+        return entries
+
+    def put(self, key, value, expires_at):
+        ttl = max(1, int(expires_at - time.time()))
+        self.client.set(f"{self.entry_prefix}{key}", json.dumps([value, expires_at]), ex=ttl)
+
+    def delete_all(self):
+        keys = list(self.client.scan_iter(match=f"{self.entry_prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def compact(self, now):
+        purge_expired = getattr(self.client, 'purge_expired', None)
+        return purge_expired(now) if purge_expired else 0
+
+    def get_meta(self, name):
+        return self._decode(self.client.get(f"{self.meta_prefix}{name}"))
+
+    def set_meta(self, name, value):
+        self.client.set(f"{self.meta_prefix}{name}", value)
+
+
+def create_backend(state_config: dict):
+    """
+    Создаёт backend по секции state конфигурации: sqlite (по умолчанию), file, redis, memory.
+    """
+    backend = state_config.get('backend', 'sqlite')
+    if backend == 'sqlite':
+        return SQLiteBackend(state_config.get('path', '/app/state/reminder.db'))
+    if backend == 'file':
+        return FileBackend(state_config.get('path', '/app/state/reminder.json'))
+    if backend == 'redis':
+        import redis  # опциональная зависимость, нужна только для этого backend
+        return RedisBackend(redis.Redis.from_url(state_config['redis_url']))
+    if backend == 'memory':
+        return RedisBackend(LocalRedis())
+    raise ValueError(f"Неизвестный backend состояния: {backend}")
+
+
+class ProcessedIncidents:
+    """
+    Словарь обработанных инцидентов (incident_id -> время обработки), который пишет каждое
+    изменение в backend и поднимает актуальные записи при старте. Записи живут entry_ttl секунд.
+    """
+    def __init__(self, backend, entry_ttl_seconds):
+        self.backend = backend
+        self.entry_ttl = entry_ttl_seconds
+        self._lock = threading.Lock()
+        now = time.time()
+        self._entries = {
+            key: (datetime.fromisoformat(value), expires_at)
+            for key, (value, expires_at) in backend.load_entries(now).items()
+        }
+        logger.info(f"Загружено {len(self._entries)} обработанных инцидентов из хранилища состояния.")
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[1] > time.time()
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._entries[key][0]
+
+    def __setitem__(self, key, value):
+        expires_at = time.time() + self.entry_ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+        self.backend.put(key, value.isoformat(), expires_at)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self.backend.delete_all()
+
+    def compact(self):
+        """
+        Удаляет просроченные записи из памяти и из backend.
+        """
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, expires_at) in self._entries.items() if expires_at <= now]
+            for key in expired:
+                del self._entries[key]
+        self.backend.compact(now)
+        return len(expired)
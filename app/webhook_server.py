@@ -0,0 +1,124 @@
+import hashlib
+import hmac
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+INCIDENT_EVENTS = {
+    'incident.triggered',
+    'incident.acknowledged',
+    'incident.unacknowledged',
+    'incident.reassigned',
+    'incident.escalated',
+    'incident.priority_updated',
+    'incident.resolved',
+    'incident.snoozed',
+}
+
+
+def verify_signature(secret, body: bytes, signature_header) -> bool:
+    """
+    Проверяет X-PagerDuty-Signature (v1=<hex HMAC-SHA256>). Заголовок может содержать
+    несколько подписей через запятую во время ротации секрета.
+    """
+    if not signature_header:
+        return False
+    expected = 'v1=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return any(hmac.compare_digest(expected, signature.strip()) for signature in signature_header.split(','))
+
+
+def incident_from_event(event: dict) -> dict:
+    """
+    Приводит инцидент из события webhook v3 к виду ответа REST API (summary вместо title).
+    """
+    incident = dict(event.get('data', {}))
+    incident.setdefault('summary', incident.get('title', ''))
+    return incident
+
+
+class WebhookHandler:
+    """
+    Обработчик событий PagerDuty Webhooks v3 для маршрута ReminderHTTPServer.
+    Без секрета подписи любой, кто достучится до порта, мог бы, например, прислать
+    incident.snoozed и заглушить напоминания, поэтому секрет обязателен.
+    """
+    def __init__(self, on_event, secret):
+        if not secret:
+            raise ValueError("Для приёма webhook PagerDuty нужен секрет подписи (webhook.secret).")
+        self.on_event = on_event
+        self.secret = secret
+
+    def __call__(self, body, headers):
+        if not verify_signature(self.secret, body, headers.get('X-PagerDuty-Signature')):
+            logger.warning("Webhook PagerDuty с неверной подписью отклонён.")
+            return 401, 'text/plain', b'invalid signature'
+        try:
+            event = json.loads(body).get('event', {})
+        except ValueError:
+            return 400, 'text/plain', b'invalid json'
+
+        event_type = event.get('event_type')
+        if event.get('resource_type') == 'incident' and event_type in INCIDENT_EVENTS:
+            try:
+                self.on_event(event_type, incident_from_event(event))
+            except Exception as e:
+                logger.exception(f"Ошибка обработки события {event_type}: {e}")
+                return 500, 'text/plain', b'error'
+        return 202, 'text/plain', b'accepted'
+
+
+class ReminderHTTPServer:
+    """
+    HTTP-сервер демона (webhook, /metrics, /healthz). Маршруты — словарь
+    (метод, путь) -> обработчик(body, headers) -> (код, content-type, тело).
+    """
+    def __init__(self, port):
+        self.port = port
+        self.routes = {}
+        self._httpd = None
+
+    def add_route(self, method, path, handler):
+        self.routes[(method, path)] = handler
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                return
+
+            def _dispatch(self, method):
+                route = server.routes.get((method, self.path.split('?')[0]))
+                if route is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                status, content_type, payload = route(body, self.headers)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+        return Handler
+
+    def start(self):
+        self._httpd = ThreadingHTTPServer(('', self.port), self._make_handler())
+        thread = threading.Thread(target=self._httpd.serve_forever, name='reminder-http-server', daemon=True)
+        thread.start()
+        logger.info(f"HTTP-сервер запущен на порту {self.port}: {sorted(path for _, path in self.routes)}.")
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
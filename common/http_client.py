@@ -0,0 +1,175 @@
+import logging
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# 5xx и сетевые ошибки повторяем только для идемпотентных методов,
+# чтобы не задублировать сообщение в Slack или инцидент в PagerDuty
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# Сегменты пути с цифрами (ID пользователей, сервисов, каналов) схлопываем для метрик
+_ID_SEGMENT = re.compile(r'^(?=.*\d)[A-Za-z0-9_-]+$')
+
+
+class HostRateLimiter:
+    """
+    Потокобезопасный ограничитель частоты запросов (token bucket) отдельно для каждого хоста.
+    rates_per_second: {хост: запросов в секунду}.
+    """
+    def __init__(self, rates_per_second: dict, default_rate=5.0):
+        self.rates = rates_per_second
+        self.default_rate = default_rate
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _key(self, url):
+        """Ключ корзины; наследники могут ограничивать не по хосту, а, например, по методу API."""
+        return urlparse(url).hostname
+
+    def acquire(self, url):
+        key = self._key(url)
+        rate = self.rates.get(key, self.default_rate)
+        # Ёмкость не меньше одного токена, иначе при rate < 1 запрос никогда не пройдёт
+        capacity = max(1.0, rate)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, updated_at = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated_at) * rate)
+                if tokens >= 1:
+                    self._buckets[key] = (tokens - 1, now)
+                    return
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            time.sleep(wait)
+
+
+def endpoint_name(method, url) -> str:
+    """
+    Имя эндпоинта для метрик: метод, хост и путь без идентификаторов.
+    """
+    parsed = urlparse(url)
+    segments = ['{id}' if _ID_SEGMENT.match(segment) else segment for segment in parsed.path.split('/')]
+    return f"{method} {parsed.hostname}{'/'.join(segments)}"
+
+
+def parse_retry_after(value):
+    """
+    Разбирает заголовок Retry-After (секунды или HTTP-дата) в секунды ожидания.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class HttpClient:
+    """
+    Общий HTTP-клиент для PagerDuty, Slack и Jira: keep-alive пул соединений на хост,
+    повтор запросов на 429/5xx с учётом Retry-After и экспоненциальной задержкой со случайным
+    разбросом, метрики задержек по эндпоинтам.
+    """
+    def __init__(self, timeout=10, max_retries=3, backoff_base=0.5, backoff_max=30.0,
+                 pool_maxsize=10, rate_limiter=None):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+        # Внешние получатели метрик: listener(endpoint, elapsed_seconds, status), status=None при сетевой ошибке
+        self.listeners = []
+
+    def _backoff(self, attempt) -> float:
+        # "Full jitter": случайная задержка от 0 до экспоненциального предела
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _record(self, endpoint, elapsed, error, status=None):
+        for listener in self.listeners:
+            listener(endpoint, elapsed, status)
+        with self._metrics_lock:
+            stats = self._metrics.setdefault(endpoint, {'count': 0, 'errors': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            stats['count'] += 1
+            stats['errors'] += int(error)
+            stats['total_seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+
+    def request(self, method, url, **kwargs):
+        method = method.upper()
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint = endpoint_name(method, url)
+
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire(url)
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                self._record(endpoint, time.monotonic() - started, True)
+                if method not in IDEMPOTENT_METHODS or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"Сетевая ошибка {endpoint}, повтор через {delay:.1f} с")
+            else:
+                self._record(endpoint, time.monotonic() - started, response.status_code >= 400, response.status_code)
+                retryable = response.status_code == 429 or (
+                    response.status_code in RETRY_STATUSES and method in IDEMPOTENT_METHODS
+                )
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                logger.warning(f"{endpoint} ответил {response.status_code}, повтор через {delay:.1f} с")
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def metrics(self) -> dict:
+        """
+        Снимок метрик по эндпоинтам: количество, ошибки, суммарная/максимальная/средняя задержка.
+        """
+        with self._metrics_lock:
+            snapshot = {endpoint: dict(stats) for endpoint, stats in self._metrics.items()}
+        for stats in snapshot.values():
+            stats['avg_seconds'] = stats['total_seconds'] / stats['count'] if stats['count'] else 0.0
+        return snapshot
+
+    def log_metrics(self):
+        for endpoint, stats in sorted(self.metrics().items()):
+            logger.info(
+                f"{endpoint}: запросов {stats['count']}, ошибок {stats['errors']}, "
+                f"среднее {stats['avg_seconds'] * 1000:.0f} мс, максимум {stats['max_seconds'] * 1000:.0f} мс"
+            )
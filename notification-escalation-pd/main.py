@@ -1,7 +1,10 @@
-import requests
 import os
+import sys
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.http_client import HttpClient
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -16,32 +19,40 @@ if not PAGERDUTY_API_TOKEN:
 if not SLACK_WEBHOOK_URL:
     raise ValueError("Переменная окружения SLACK_WEBHOOK_URL отсутствует.")
 
+# batch — один проход по /oncalls и /users с правилами уведомлений,
+# per_user — старый режим с двумя запросами на каждого пользователя
+ONCALL_LOOKUP_MODE = os.getenv('ONCALL_LOOKUP_MODE', 'batch')
+
 # Заголовки для запросов к API PagerDuty
 headers = {
     'Authorization': f'Token token={PAGERDUTY_API_TOKEN}',
     'Accept': 'application/vnd.pagerduty+json;version=2'
 }
 
+http = HttpClient(timeout=10)
+
 # Функция для отправки сообщения в Slack через Webhook
 def send_to_slack(message):
     payload = {'text': message}
     try:
-        response = requests.post(SLACK_WEBHOOK_URL, json=payload, timeout=10)
+        response = http.post(SLACK_WEBHOOK_URL, json=payload)
         response.raise_for_status()
         logger.info(f"Сообщение отправлено в Slack: {message}")
     except Exception as e:
         logger.error(f'Ошибка отправки сообщения в Slack: {e}')
 
 # Функция для получения списка всех пользователей
-def get_all_users():
+def get_all_users(include=None):
     url = "https://api.pagerduty.com/users"
     users = []
     offset = 0
     limit = 100  # Максимальное количество пользователей за один запрос
     while True:
         params = {'offset': offset, 'limit': limit}
+        if include:
+            params['include[]'] = include
         try:
-            response = requests.get(url, headers=headers, params=params, timeout=10)
+            response = http.get(url, headers=headers, params=params)
             response.raise_for_status()
             data = response.json()
             users.extend(data.get('users', []))
@@ -57,7 +68,7 @@ def get_all_users():
 def has_alternative_notification_methods(user_id):
     url = f"https://api.pagerduty.com/users/{user_id}/notification_rules"
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = http.get(url, headers=headers)
         response.raise_for_status()
         notification_rules = response.json().get('notification_rules', [])
         for rule in notification_rules:
@@ -72,7 +83,7 @@ def is_user_on_call(user_id):
     url = "https://api.pagerduty.com/oncalls"
     params = {'user_ids[]': user_id}
     try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
+        response = http.get(url, headers=headers, params=params)
         response.raise_for_status()
         oncalls = response.json().get('oncalls', [])
         return len(oncalls) > 0
@@ -80,12 +91,67 @@ def is_user_on_call(user_id):
         logger.error(f"Ошибка при проверке расписания дежурств для пользователя {user_id}: {e}")
     return False
 
-# Основная функция для проверки пользователей и отправки уведомлений
-def check_users():
+# Функция для получения ID всех пользователей, которые сейчас на дежурстве (одним постраничным проходом)
+def get_on_call_user_ids():
+    url = "https://api.pagerduty.com/oncalls"
+    user_ids = set()
+    offset = 0
+    limit = 100
+    while True:
+        params = {'offset': offset, 'limit': limit}
+        try:
+            response = http.get(url, headers=headers, params=params)
+            response.raise_for_status()
+            data = response.json()
+        except Exception as e:
+            logger.error(f"Ошибка при получении списка дежурств: {e}")
+            return None
+        for oncall in data.get('oncalls', []):
+            user_id = oncall.get('user', {}).get('id')
+            if user_id:
+                user_ids.add(user_id)
+        if not data.get('more', False):
+            return user_ids
+        offset += limit
+
+# Проверка альтернативных методов по правилам, полученным вместе с пользователем (include[]=notification_rules).
+# /users/{id}/notification_rules по умолчанию отдаёт только правила urgency=high, а include — все,
+# поэтому правила low urgency не учитываются, как и в has_alternative_notification_methods
+def has_alternative_notification_rules(notification_rules):
+    for rule in notification_rules:
+        if rule.get('urgency') != 'high':
+            continue
+        # Во вложенных правилах метод связи может прийти ссылкой: email_contact_method_reference
+        contact_type = rule.get('contact_method', {}).get('type', '')
+        if contact_type.replace('_reference', '') != 'email_contact_method':
+            return True
+    return False
+
+def find_users_without_notifications_batch():
+    on_call_user_ids = get_on_call_user_ids()
+    if on_call_user_ids is None:
+        return None
+    if not on_call_user_ids:
+        return []
+
+    users = get_all_users(include='notification_rules')
+    if not users:
+        return None
+
+    users_without_notifications = []
+    for user in users:
+        user_id = user.get('id')
+        user_email = user.get('email')
+        if not user_id or not user_email or user_id not in on_call_user_ids:
+            continue
+        if not has_alternative_notification_rules(user.get('notification_rules', [])):
+            users_without_notifications.append(user_email)
+    return users_without_notifications
+
+def find_users_without_notifications_per_user():
     users = get_all_users()
     if not users:
-        logger.info("Список пользователей пуст или не удалось получить данные.")
-        return
+        return None
 
     users_without_notifications = []
     for user in users:
@@ -96,6 +162,17 @@ def check_users():
 
         if is_user_on_call(user_id) and not has_alternative_notification_methods(user_id):
             users_without_notifications.append(user_email)
+    return users_without_notifications
+
+# Основная функция для проверки пользователей и отправки уведомлений
+def check_users():
+    if ONCALL_LOOKUP_MODE == 'per_user':
+        users_without_notifications = find_users_without_notifications_per_user()
+    else:
+        users_without_notifications = find_users_without_notifications_batch()
+    if users_without_notifications is None:
+        logger.info("Список пользователей пуст или не удалось получить данные.")
+        return
 
     if users_without_notifications:
         message = ("Следующие пользователи включены в расписание дежурств, "
@@ -109,6 +186,7 @@ if __name__ == '__main__':
     try:
         logger.info("Запуск проверки пользователей в PagerDuty")
         check_users()
+        http.log_metrics()
     except KeyboardInterrupt:
         logger.info("Скрипт завершён вручную.")
     except Exception as e:
@@ -1,7 +1,11 @@
 import os
+import sys
 import requests
 import logging
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.http_client import HttpClient
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,22 +18,58 @@ description = "Almaty Never Sleeps"
 slack_webhook_url = os.getenv('SLACK_BOT_TOKEN')
 slack_channel_id = os.getenv('SLACK_CHANNEL_PUBLIC_ID')
 
-def get_active_incidents(api_token):
+HIGH_PRIORITIES = {"p1", "p2"}
+# Размер страницы /incidents (максимум PagerDuty — 100)
+INCIDENTS_PAGE_LIMIT = int(os.getenv('INCIDENTS_PAGE_LIMIT', 100))
+# Необязательные фильтры на стороне PagerDuty, через запятую: например INCIDENT_URGENCIES=high,
+# HIGH_PRIORITY_SERVICE_IDS=P123,P456 — если P1/P2 заводятся только в этих сервисах
+INCIDENT_URGENCIES = [urgency for urgency in os.getenv('INCIDENT_URGENCIES', '').split(',') if urgency]
+HIGH_PRIORITY_SERVICE_IDS = [service for service in os.getenv('HIGH_PRIORITY_SERVICE_IDS', '').split(',') if service]
+
+http = HttpClient(timeout=10)
+
+def iter_active_incidents(api_token):
+    """
+    Активные инциденты постранично (offset/limit). Генератор: следующая страница
+    запрашивается, только если вызывающий код дочитал предыдущую.
+    """
     url = "https://api.pagerduty.com/incidents"
     headers = {
         "Authorization": f"Token token={api_token}",
         "Accept": "application/vnd.pagerduty+json;version=2"
     }
     params = {
-        "statuses[]": ["triggered", "acknowledged"]
+        "statuses[]": ["triggered", "acknowledged"],
+        "limit": INCIDENTS_PAGE_LIMIT,
+        "offset": 0
     }
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        return response.json().get("incidents", [])
-    except requests.exceptions.RequestException as e:
-        logger.error("Ошибка при получении инцидентов: %s", e)
-        return []
+    if INCIDENT_URGENCIES:
+        params["urgencies[]"] = INCIDENT_URGENCIES
+    if HIGH_PRIORITY_SERVICE_IDS:
+        params["service_ids[]"] = HIGH_PRIORITY_SERVICE_IDS
+    while True:
+        try:
+            response = http.get(url, headers=headers, params=params)
+            response.raise_for_status()
+            data = response.json()
+        except requests.exceptions.RequestException as e:
+            logger.error("Ошибка при получении инцидентов: %s", e)
+            return
+        yield from data.get("incidents", [])
+        if not data.get("more"):
+            return
+        params["offset"] += INCIDENTS_PAGE_LIMIT
+
+def is_high_priority(incident):
+    priority = incident.get("priority") or {}
+    return priority.get("summary", "").lower() in HIGH_PRIORITIES
+
+def find_high_priority_incident(api_token):
+    """
+    Первый активный инцидент P1/P2 или None. PagerDuty не фильтрует /incidents по приоритету,
+    поэтому приоритет проверяется здесь, а страницы дальше первой совпадающей не запрашиваются.
+    """
+    return next((incident for incident in iter_active_incidents(api_token) if is_high_priority(incident)), None)
 
 def create_incident(api_token, service_id, title, description):
     url = "https://api.pagerduty.com/incidents"
@@ -53,7 +93,7 @@ def create_incident(api_token, service_id, title, description):
         }
     }
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=10)
+        response = http.post(url, headers=headers, json=payload)
         response.raise_for_status()
         logger.info("Инцидент успешно создан: %s", response.json())
         return response.json()
@@ -68,24 +108,21 @@ def send_slack_message(webhook_url, channel_id, message):
         "text": message
     }
     try:
-        response = requests.post(webhook_url, headers=headers, json=payload, timeout=10)
+        response = http.post(webhook_url, headers=headers, json=payload)
         response.raise_for_status()
         logger.info("Сообщение отправлено в Slack: %s", message)
     except requests.exceptions.RequestException as e:
         logger.error("Ошибка при отправке сообщения в Slack: %s", e)
 
 def main():
-    active_incidents = get_active_incidents(api_token)
-
     # Проверка на наличие активных инцидентов с приоритетом P1 или P2
-    high_priority_exists = any(
-        incident.get("priority") and
-        incident["priority"].get("summary", "").lower() in {"p1", "p2"}
-        for incident in active_incidents
-    )
+    high_priority_incident = find_high_priority_incident(api_token)
 
-    if high_priority_exists:
-        logger.info("Существуют активные инциденты уровня P1 или P2. Новый инцидент не будет создан.")
+    if high_priority_incident:
+        logger.info(
+            "Существуют активные инциденты уровня P1 или P2 (%s). Новый инцидент не будет создан.",
+            high_priority_incident.get("id")
+        )
         slack_message = "⚠️ Новая проверка не была заведена, так как существуют активные инциденты уровня P1 или P2. Удачи в разрешении инцидента"
         send_slack_message(slack_webhook_url, slack_channel_id, slack_message)
     else:
@@ -98,3 +135,4 @@ def main():
 
 if __name__ == "__main__":
     main()
+    http.log_metrics()
@@ -1,7 +1,12 @@
 from pyzabbix import ZabbixAPI
-from time import mktime
-from datetime import datetime, timedelta
+from time import mktime, monotonic
+from datetime import datetime, timedelta, timezone
 from csv import DictWriter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+import json
+import os
+import re
+import threading
 
 #Выводит данные и item всего хоста. Нужен для переноса информации в CSV
 
@@ -11,7 +16,306 @@ class Settings:
     zabbix_password: str = 'YOU-PASSWORD'
     zabbix_url: str = 'https://zabbix.console3.com/'
 
-    host_id: str = "ID"
+    # Hosts to export: host ids and/or host group ids (all hosts of the groups).
+    # An item selected through several of them is exported once.
+    host_ids: list = ["ID"]
+    host_group_ids: list = []
+
+    # Export settings:
+    history_days: int = 730
+    # History is requested window by window and page by page, so memory stays bounded
+    window_hours: int = 24
+    page_limit: int = 10000
+    # Items of one value type are requested together, up to items_per_request ids per call
+    items_per_request: int = 100
+
+    # Item batches are exported in parallel; progress is checkpointed so an interrupted export resumes
+    workers: int = 4
+    checkpoint_file: str = "zabbix_export_checkpoint.json"
+    progress_interval_seconds: int = 10
+
+    # Output: "csv" (one file per item in <output_dir>/<host>/, named by item id), "parquet" or "arrow"
+    # (one dataset partitioned by host/item/day, needs pyarrow). All hosts and items share one set of columns.
+    output_format: str = "csv"
+    output_dir: str = "zabbix_history"
+
+    # Resolution: "raw" — full history; "hourly" — for numeric items, trend.get (hourly min/avg/max)
+    # for data older than raw_days and local min/avg/max rollup of the recent raw history
+    # into rollup_seconds buckets (a divisor of 3600). Non-numeric items are always exported raw.
+    resolution: str = "raw"
+    raw_days: int = 7
+    rollup_seconds: int = 3600
+
+
+# Zabbix keeps trends only for numeric items: 0 float, 3 unsigned
+NUMERIC_VALUE_TYPES: tuple = (0, 3)
+TREND_SECONDS: int = 3600
+# ns of a resume point that covers a whole second
+LAST_NS: int = 999999999
+
+
+class Rollup:
+    """
+    Incremental min/avg/max rollup of one item's raw history into buckets of `seconds`.
+    The open bucket is kept between calls, so add() returns complete buckets only.
+    """
+    def __init__(self, seconds: int):
+        self._seconds: int = seconds
+        self._bucket: list = None  # [start, num, min, sum, max]
+
+    def add(self, rows: list) -> list:
+        aggregated: list = []
+        for item_data in rows:
+            clock: int = int(item_data["clock"])
+            value: float = float(item_data["value"])
+            start: int = clock - clock % self._seconds
+            bucket: list = self._bucket
+            if bucket and bucket[0] == start:
+                bucket[1] += 1
+                bucket[2] = min(bucket[2], value)
+                bucket[3] += value
+                bucket[4] = max(bucket[4], value)
+                continue
+            if bucket:
+                aggregated.append(self._row(bucket))
+            self._bucket = [start, 1, value, value, value]
+        return aggregated
+
+    def flush(self) -> list:
+        bucket, self._bucket = self._bucket, None
+        return [self._row(bucket)] if bucket else []
+
+    @staticmethod
+    def _row(bucket: list) -> dict:
+        start, num, value_min, value_sum, value_max = bucket
+        return {
+            "clock": start,
+            "num": num,
+            "value_min": value_min,
+            "value_avg": value_sum / num,
+            "value_max": value_max
+        }
+
+
+class CsvItemWriter:
+    """
+    One CSV file per item, <output_dir>/<host>/<item_id>_<item_name>.csv: item names are not unique
+    within a host, so the name (with path-unsafe characters replaced) only helps to find the file.
+    Checkpoint position is the file offset after the last page.
+    All files share one header, so raw and hourly items of every host read as one table;
+    columns that do not apply to the item are left empty.
+    """
+    fieldnames: list = [
+        "host",
+        "item_id",
+        "item_name",
+        "Unix_timestamp",
+        "Nano_seconds",
+        "Value",
+        "Num",
+        "Min",
+        "Avg",
+        "Max"
+    ]
+
+    def __init__(self, item_id: str, item: dict, output_dir: str, state: dict):
+        self._host: str = item["host"]
+        self._item_id: str = item_id
+        self._item_name: str = item["item_name"]
+        self._aggregated: bool = item["aggregated"]
+        resume: bool = "last_clock" in state
+        host_dir: str = os.path.join(output_dir, item["host"])
+        os.makedirs(host_dir, exist_ok=True)
+        safe_name: str = re.sub(r"[^\w.-]+", "_", item["item_name"])
+        self._file = open(
+            os.path.join(host_dir, f"{item_id}_{safe_name}.csv"),
+            "r+" if resume else "w",
+            newline='',
+            encoding="UTF-8"
+        )
+        self._writer = DictWriter(self._file, fieldnames=self.fieldnames)
+        if resume:
+            # Drop rows written after the last checkpoint so they are not duplicated
+            self._file.truncate(state["offset"])
+            self._file.seek(state["offset"])
+        else:
+            self._writer.writeheader()
+
+    def write_page(self, page: list):
+        if self._aggregated:
+            self._writer.writerows(
+                {
+                    "host": self._host,
+                    "item_id": self._item_id,
+                    "item_name": self._item_name,
+                    "Unix_timestamp": item_data["clock"],
+                    "Num": item_data["num"],
+                    "Min": item_data["value_min"],
+                    "Avg": item_data["value_avg"],
+                    "Max": item_data["value_max"]
+                }
+                for item_data in page
+            )
+            self._file.flush()
+            return
+        self._writer.writerows(
+            {
+                "host": self._host,
+                "item_id": self._item_id,
+                "item_name": self._item_name,
+                "Unix_timestamp": item_data["clock"],
+                "Nano_seconds": item_data["ns"],
+                "Value": item_data["value"]
+            }
+            for item_data in page
+        )
+        self._file.flush()
+
+    def position(self) -> dict:
+        return {"offset": self._file.tell()}
+
+    def close(self):
+        self._file.close()
+
+    def abort(self):
+        # Rows after the checkpoint offset are truncated on resume
+        self._file.close()
+
+
+class ArrowItemWriter:
+    """
+    Columnar output: pages become typed column arrays, split by UTC day and written to one file per
+    partition, <output_dir>/host=<host>/item_id=<id>/date=<YYYY-MM-DD>/data.<ext>.
+
+    Every file has the same schema whatever the item's value type and resolution: the raw value goes
+    to value_float, value_uint or value_str, rollups to num/value_min/value_avg/value_max, and columns
+    that do not apply are null. So the whole output reads as one dataset.
+
+    Rows arrive ordered by clock, so only the current day is open; it is written under a hidden
+    temporary name and renamed when the day rolls over. The checkpoint points at the end of the last
+    finished day, so a resumed export rewrites the unfinished day from its start.
+    """
+    columns: list = [
+        ("clock", "int64"),
+        ("ns", "int32"),
+        ("value_float", "float64"),
+        ("value_uint", "uint64"),
+        ("value_str", "string"),
+        ("num", "int32"),
+        ("value_min", "float64"),
+        ("value_avg", "float64"),
+        ("value_max", "float64")
+    ]
+    # Zabbix value_type -> raw value column: 0 float, 3 unsigned, 1/2/4 char/log/text
+    value_columns: dict = {0: "value_float", 3: "value_uint"}
+    # Rows buffered before a row group / record batch is written
+    row_group_rows: int = 65536
+
+    def __init__(self, item_id: str, item: dict, output_dir: str, output_format: str):
+        try:
+            import pyarrow
+        except ImportError:
+            raise SystemExit("Parquet/Arrow output needs pyarrow: pip3 install pyarrow")
+        self._pa = pyarrow
+        self._item_id: str = item_id
+        self._item_dir: str = os.path.join(output_dir, f"host={item['host']}", f"item_id={item_id}")
+        self._output_format: str = output_format
+        self._aggregated: bool = item["aggregated"]
+        self._day: int = None
+        self._writer = None
+        self._path: str = None
+        self._buffer: list = []
+        self._buffered_rows: int = 0
+        self._schema = pyarrow.schema([(name, getattr(pyarrow, type_name)()) for name, type_name in self.columns])
+        self._value_column: str = self.value_columns.get(item["value_type"], "value_str")
+        self._value_cast = float if item["value_type"] == 0 else int if item["value_type"] == 3 else str
+
+    def _columns(self, page: list) -> dict:
+        """Values of the columns the item fills; the other columns of the schema are written as nulls."""
+        if self._aggregated:
+            return {
+                "clock": [int(item_data["clock"]) for item_data in page],
+                "num": [int(item_data["num"]) for item_data in page],
+                "value_min": [float(item_data["value_min"]) for item_data in page],
+                "value_avg": [float(item_data["value_avg"]) for item_data in page],
+                "value_max": [float(item_data["value_max"]) for item_data in page]
+            }
+        return {
+            "clock": [int(item_data["clock"]) for item_data in page],
+            "ns": [int(item_data["ns"]) for item_data in page],
+            self._value_column: [self._value_cast(item_data["value"]) for item_data in page]
+        }
+
+    def write_page(self, page: list):
+        columns: dict = self._columns(page)
+        clocks: list = columns["clock"]
+        start: int = 0
+        while start < len(clocks):
+            day: int = clocks[start] // 86400
+            end: int = start
+            while end < len(clocks) and clocks[end] // 86400 == day:
+                end += 1
+            if day != self._day:
+                self._close_day()
+                self._open_day(day)
+            self._buffer.append(self._pa.record_batch(
+                [
+                    self._pa.array(columns[field.name][start:end], field.type) if field.name in columns
+                    else self._pa.nulls(end - start, field.type)
+                    for field in self._schema
+                ],
+                schema=self._schema
+            ))
+            self._buffered_rows += end - start
+            if self._buffered_rows >= self.row_group_rows:
+                self._flush()
+            start = end
+
+    def _open_day(self, day: int):
+        date: str = datetime.fromtimestamp(day * 86400, timezone.utc).strftime("%Y-%m-%d")
+        directory: str = os.path.join(self._item_dir, f"date={date}")
+        os.makedirs(directory, exist_ok=True)
+        extension: str = "parquet" if self._output_format == "parquet" else "arrow"
+        self._path = os.path.join(directory, f"data.{extension}")
+        # Hidden name: dataset readers skip it until the day is complete
+        tmp_path: str = os.path.join(directory, f".data.{extension}.tmp")
+        if self._output_format == "parquet":
+            import pyarrow.parquet
+            self._writer = pyarrow.parquet.ParquetWriter(tmp_path, self._schema)
+        else:
+            import pyarrow.ipc
+            self._writer = pyarrow.ipc.new_file(tmp_path, self._schema)
+        self._day = day
+
+    def _flush(self):
+        if self._buffer:
+            self._writer.write_table(self._pa.Table.from_batches(self._buffer).combine_chunks())
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def _close_day(self):
+        if self._writer is None:
+            return
+        self._flush()
+        self._writer.close()
+        directory, name = os.path.split(self._path)
+        os.replace(os.path.join(directory, f".{name}.tmp"), self._path)
+        self._writer = None
+
+    def position(self) -> dict:
+        if self._day is None:
+            return {}
+        # Resume from the start of the open day: it is rewritten as a whole
+        return {"last_clock": self._day * 86400 - 1, "last_ns": LAST_NS}
+
+    def close(self):
+        self._close_day()
+
+    def abort(self):
+        """Stop after a failure: the unfinished day stays hidden and is rewritten on resume."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
 
 
 class GetDataFromZabbixItem(Settings):
@@ -24,26 +328,89 @@ class GetDataFromZabbixItem(Settings):
         )
 
         self._item_id_collections: dict = {}
-        self._item_raw_data_collection: dict = {}
+
+        self._local = threading.local()
+        self._checkpoint: dict = {}
+        self._checkpoint_lock = threading.Lock()
+        self._rows_exported: int = 0
+        self._items_done: int = 0
+
+    def _api(self) -> ZabbixAPI:
+        """
+        Per-thread API client sharing the session token of the main login.
+        """
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = ZabbixAPI(self.zabbix_url)
+            api.auth = self._zabbix_api.auth
+            self._local.api = api
+        return api
+
+    def _load_checkpoint(self, time_from: int, time_till: int) -> (int, int):
+        """
+        Load checkpoint of a previous run. The previous time range is reused so the resumed
+        export continues exactly where it stopped.
+        """
+        if os.path.exists(self.checkpoint_file):
+            with open(self.checkpoint_file, encoding="UTF-8") as file:
+                self._checkpoint = json.load(file)
+            print(f"Resuming export from {self.checkpoint_file}")
+            # Items finished by the previous run count towards progress too
+            self._items_done = sum(
+                1 for item_id, state in self._checkpoint["items"].items()
+                if state.get("done") and item_id in self._item_id_collections
+            )
+            return self._checkpoint["time_from"], self._checkpoint["time_till"]
+        self._checkpoint = {"time_from": time_from, "time_till": time_till, "items": {}}
+        return time_from, time_till
+
+    def _save_checkpoint(self, states: dict):
+        """
+        :param states: item id -> checkpoint state of the item.
+        """
+        with self._checkpoint_lock:
+            self._checkpoint["items"].update(states)
+            tmp_path: str = f"{self.checkpoint_file}.tmp"
+            with open(tmp_path, "w", encoding="UTF-8") as file:
+                json.dump(self._checkpoint, file)
+            os.replace(tmp_path, self.checkpoint_file)
 
     def _get_host_items(self):
-        all_host_items: dict = self._zabbix_api.item.get(
-            filter={
-                "hostid": self.host_id
-            }
-        )
-        for item in all_host_items:
-            self._item_id_collections.update(
-                {
-                    item["itemid"]: {
-                        "item_name": item['name'],
-                        "item_key": item["key_"]
-                    }
-                }
+        selectors: list = []
+        if self.host_ids:
+            selectors.append({"hostids": self.host_ids})
+        if self.host_group_ids:
+            selectors.append({"groupids": self.host_group_ids})
+        for selector in selectors:
+            all_host_items: list = self._zabbix_api.item.get(
+                output=["itemid", "name", "key_", "value_type"],
+                selectHosts=["host"],
+                **selector
             )
+            for item in all_host_items:
+                # Keyed by item id: hosts listed both directly and through a group are not exported twice
+                self._item_id_collections[item["itemid"]] = {
+                    "host": item["hosts"][0]["host"],
+                    "item_name": item['name'],
+                    "item_key": item["key_"],
+                    "value_type": int(item["value_type"]),
+                    "aggregated": self.resolution == "hourly" and int(item["value_type"]) in NUMERIC_VALUE_TYPES
+                }
 
-    @staticmethod
-    def _create_data_time() -> (int, int):
+    def _item_batches(self) -> list:
+        """
+        Split items into batches of one value type (one history table) of up to items_per_request ids.
+        """
+        by_value_type: dict = {}
+        for item_id, item in sorted(self._item_id_collections.items()):
+            by_value_type.setdefault(item["value_type"], []).append(item_id)
+        return [
+            (value_type, item_ids[start:start + self.items_per_request])
+            for value_type, item_ids in sorted(by_value_type.items())
+            for start in range(0, len(item_ids), self.items_per_request)
+        ]
+
+    def _create_data_time(self) -> (int, int):
         return (
             int(
                 mktime(
@@ -55,97 +422,254 @@ class GetDataFromZabbixItem(Settings):
                 mktime(
                     (
                         datetime.now()
-                        - timedelta(days=730)
+                        - timedelta(days=self.history_days)
                     ).timetuple()
                 )
             )
         )
 
-    def _land_data(self):
+    def _iter_windows(self, time_from: int, time_till: int, window_hours: int = None):
         """
-        Parse items values to hash table.
+        Split [time_from, time_till] into consecutive windows of window_hours.
         """
-        for item_id in self._item_raw_data_collection:
-            data_for_landing: list = []
-            for item_data in self._item_raw_data_collection[item_id]["item_history"]:
-                data_for_landing.append(
-                    {
-                        "item_id": item_id,
-                        "item_name": self._item_raw_data_collection[item_id]["item_name"],
-                        "Unix_timestamp": item_data["clock"],
-                        "Nano_seconds": item_data["ns"],
-                        "Value": item_data["value"]
-                    }
-                )
-            with open(
-                f"{self._item_raw_data_collection[item_id]['item_name']}.csv",
-                "w",
-                newline='',
-                encoding="UTF-8"
-            ) as file:
-                writer = DictWriter(
-                    file,
-                    fieldnames=[
-                        "item_id",
-                        "item_name",
-                        "Unix_timestamp",
-                        "Nano_seconds",
-                        "Value"
-                    ]
-                )
-                writer.writeheader()
-                writer.writerows(data_for_landing)
+        step: int = (window_hours or self.window_hours) * 3600
+        window_from: int = time_from
+        while window_from <= time_till:
+            window_till: int = min(window_from + step - 1, time_till)
+            yield window_from, window_till
+            window_from = window_till + 1
 
-    def execute(self):
-        self._get_host_items()
-        time_till, time_from = self._create_data_time()
+    def _iter_zabbix_history(self, *, item_ids: list, value_type: int, time_from: int, time_till: int):
+        """
+        Stream history pages of several items from Zabbix server, window by window, paging by clock.
 
-        for item_id in self._item_id_collections:
-            item_history: list = self._get_zabbix_history(
-                item_id=item_id,
-                time_from=time_from,
-                time_till=time_till
-            )
-            self._item_raw_data_collection.update(
-                {
-                    item_id: {
-                        "item_name": self._item_id_collections[item_id]["item_name"],
-                        "item_history": item_history
+        :param item_ids: Zabbix item ids, all of the same value type.
+        :type item_ids: list
+        :param value_type: Zabbix item value type (history table).
+        :type value_type: int
+        :param time_from: datatime from time.
+        :type time_from: int
+        :param time_till: datatime till time.
+        :type time_till: int
+        :return: generator of non-empty lists of history rows ordered by clock
+        """
+        for window_from, window_till in self._iter_windows(time_from, time_till):
+            cursor: int = window_from
+            # Rows of the cursor second that were already yielded by the previous page
+            boundary: set = set()
+            while True:
+                page: list = self._api().history.get(
+                    itemids=item_ids,
+                    history=value_type,
+                    time_from=cursor,
+                    time_till=window_till,
+                    sortfield="clock",
+                    sortorder="ASC",
+                    limit=self.page_limit,
+                    output='extend',
+                )
+                new_rows: list = [
+                    row for row in page
+                    if (row["itemid"], row["clock"], row["ns"]) not in boundary
+                ]
+                if new_rows:
+                    yield new_rows
+                if len(page) < self.page_limit:
+                    break
+                last_clock: int = int(page[-1]["clock"])
+                if last_clock == cursor:
+                    # A whole page within one second: move on to avoid looping forever
+                    cursor += 1
+                    boundary = set()
+                else:
+                    # The next page starts at the last clock of this one, skip rows already yielded
+                    cursor = last_clock
+                    boundary = {
+                        (row["itemid"], row["clock"], row["ns"])
+                        for row in page if int(row["clock"]) == last_clock
                     }
-                }
-            )
-        self._land_data()
-        print(
-            "Successfully"
-        )
 
-    def _get_zabbix_history(self, *, item_id: str, time_from: int, time_till: int) -> list:
+    def _iter_zabbix_trends(self, *, item_ids: list, time_from: int, time_till: int):
         """
-        Get history with orders count from Zabbix server.
+        Stream hourly trend pages (min/avg/max per hour) of several items from Zabbix server.
 
-        :param item_id: Zabbix item id.
-        :type item_id: str
+        trend.get has no paging, so windows are sized to hold at most page_limit hourly rows.
+
+        :param item_ids: Zabbix item ids.
+        :type item_ids: list
         :param time_from: datatime from time.
         :type time_from: int
         :param time_till: datatime till time.
         :type time_till: int
-        :return: list
+        :return: generator of non-empty lists of trend rows ordered by clock
         """
-        history: list = self._zabbix_api.history.get(
-            itemids=[item_id],
-            time_from=time_from,
-            time_till=time_till,
-            output='extend',
-        )
-        if not len(history):
-            history = self._zabbix_api.history.get(
-                itemids=[item_id],
+        window_hours: int = max(1, self.page_limit // len(item_ids))
+        for window_from, window_till in self._iter_windows(time_from, time_till, window_hours=window_hours):
+            trends: list = self._api().trend.get(
+                itemids=item_ids,
+                time_from=window_from,
+                time_till=window_till,
+                output=["itemid", "clock", "num", "value_min", "value_avg", "value_max"]
+            )
+            page: list = sorted(trends, key=lambda trend: int(trend["clock"]))
+            if page:
+                yield page
+
+    def _iter_batch_pages(self, *, item_ids: list, value_type: int, time_from: int, time_till: int,
+                          resume: dict):
+        """
+        Pages of a batch of items split per item: {item_id: (rows, checkpoint position of the last row)}.
+
+        :param resume: item id -> (clock, ns) of the last exported row; rows up to it are skipped.
+        :type resume: dict
+        """
+        def split(page: list, position) -> dict:
+            item_rows: dict = {}
+            for row in page:
+                if row["itemid"] in resume and position(row) <= resume[row["itemid"]]:
+                    continue
+                item_rows.setdefault(row["itemid"], []).append(row)
+            return {item_id: (rows, position(rows[-1])) for item_id, rows in item_rows.items()}
+
+        def raw_position(row: dict) -> tuple:
+            return int(row["clock"]), int(row["ns"])
+
+        if not (self.resolution == "hourly" and value_type in NUMERIC_VALUE_TYPES):
+            for page in self._iter_zabbix_history(
+                item_ids=item_ids,
+                value_type=value_type,
+                time_from=time_from,
+                time_till=time_till
+            ):
+                item_pages: dict = split(page, raw_position)
+                if item_pages:
+                    yield item_pages
+            return
+
+        # Trends for the old part of the range, raw history rolled up locally for the recent part
+        split_clock: int = max(time_from, time_till - self.raw_days * 86400)
+        split_clock -= split_clock % TREND_SECONDS
+        if time_from < split_clock:
+            for page in self._iter_zabbix_trends(item_ids=item_ids, time_from=time_from, time_till=split_clock - 1):
+                item_pages = split(page, lambda row: (int(row["clock"]) + TREND_SECONDS - 1, LAST_NS))
+                if item_pages:
+                    yield item_pages
+
+        def bucket_position(row: dict) -> tuple:
+            return row["clock"] + self.rollup_seconds - 1, LAST_NS
+
+        rollups: dict = {item_id: Rollup(self.rollup_seconds) for item_id in item_ids}
+        for page in self._iter_zabbix_history(
+            item_ids=item_ids,
+            value_type=value_type,
+            time_from=max(time_from, split_clock),
+            time_till=time_till
+        ):
+            item_pages = {}
+            for item_id, (rows, _) in split(page, raw_position).items():
+                buckets: list = rollups[item_id].add(rows)
+                if buckets:
+                    item_pages[item_id] = (buckets, bucket_position(buckets[-1]))
+            if item_pages:
+                yield item_pages
+        item_pages = {}
+        for item_id, rollup in rollups.items():
+            buckets = rollup.flush()
+            if buckets:
+                item_pages[item_id] = (buckets, bucket_position(buckets[-1]))
+        if item_pages:
+            yield item_pages
+
+    def _open_writer(self, item_id: str, state: dict):
+        item: dict = self._item_id_collections[item_id]
+        if self.output_format == "csv":
+            return CsvItemWriter(item_id, item, self.output_dir, state)
+        return ArrowItemWriter(item_id, item, self.output_dir, self.output_format)
+
+    def _export_batch(self, value_type: int, item_ids: list, time_from: int, time_till: int) -> int:
+        """
+        Write history of a batch of items as pages arrive, checkpointing every item after every page.
+        """
+        states: dict = {item_id: self._checkpoint["items"].get(item_id, {}) for item_id in item_ids}
+        item_ids = [item_id for item_id in item_ids if not states[item_id].get("done")]
+        if not item_ids:
+            return 0
+        resume: dict = {
+            item_id: (states[item_id]["last_clock"], states[item_id]["last_ns"])
+            for item_id in item_ids if "last_clock" in states[item_id]
+        }
+        # The batch restarts from the item that is furthest behind, the others skip what they have
+        if len(resume) == len(item_ids):
+            time_from = max(time_from, min(resume.values())[0])
+
+        rows_written: int = 0
+        writers: dict = {}
+        try:
+            for item_id in item_ids:
+                writers[item_id] = self._open_writer(item_id, states[item_id])
+            for item_pages in self._iter_batch_pages(
+                item_ids=item_ids,
+                value_type=value_type,
                 time_from=time_from,
                 time_till=time_till,
-                output='extend',
-                history=0
-            )
-        return history
+                resume=resume
+            ):
+                checkpoint: dict = {}
+                for item_id, (rows, (last_clock, last_ns)) in item_pages.items():
+                    writers[item_id].write_page(rows)
+                    rows_written += len(rows)
+                    checkpoint[item_id] = {"last_clock": last_clock, "last_ns": last_ns, **writers[item_id].position()}
+                with self._checkpoint_lock:
+                    self._rows_exported += sum(len(rows) for rows, _ in item_pages.values())
+                self._save_checkpoint(checkpoint)
+        except BaseException:
+            for writer in writers.values():
+                writer.abort()
+            raise
+        for writer in writers.values():
+            writer.close()
+        self._save_checkpoint({item_id: {"done": True} for item_id in item_ids})
+        with self._checkpoint_lock:
+            self._items_done += len(item_ids)
+        return rows_written
+
+    def _report_progress(self, started: float):
+        elapsed: float = monotonic() - started
+        print(
+            f"Items {self._items_done}/{len(self._item_id_collections)}, "
+            f"rows {self._rows_exported}, {self._rows_exported / elapsed if elapsed else 0:.0f} rows/s, "
+            f"elapsed {elapsed:.0f}s"
+        )
+
+    def execute(self):
+        self._get_host_items()
+        time_till, time_from = self._create_data_time()
+        time_from, time_till = self._load_checkpoint(time_from, time_till)
+
+        started: float = monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending: set = {
+                executor.submit(self._export_batch, value_type, item_ids, time_from, time_till)
+                for value_type, item_ids in self._item_batches()
+            }
+            try:
+                while pending:
+                    done, pending = wait(pending, timeout=self.progress_interval_seconds, return_when=FIRST_EXCEPTION)
+                    for future in done:
+                        # Re-raise worker errors; the checkpoint keeps finished pages for the next run
+                        future.result()
+                    self._report_progress(started)
+            except BaseException:
+                # Drop queued batches instead of exporting them all before the error surfaces
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        # No checkpoint is written when there are no items to export
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+        print(
+            "Successfully"
+        )
 
 
 if __name__ == "__main__":
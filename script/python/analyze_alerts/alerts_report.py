@@ -0,0 +1,200 @@
+"""
+Отчёт analyze_alerts: статистика по файлам, по каталогам и общий итог.
+
+Отчёт строится по событиям обхода (файл → итог каталога → общий итог) и сразу пишется
+в поток. Каталоги разбираются по одному непосредственно перед выводом, поэтому из результатов
+разбора в памяти держится только текущий каталог.
+"""
+import csv
+import json
+
+STAT_KEYS = ('total', 'without_runbook', 'with_runbook')
+
+
+def new_stats(**fields):
+    stats = dict.fromkeys(STAT_KEYS, 0)
+    stats.update(fields)
+    return stats
+
+
+def add_stats(target, stats):
+    for key in STAT_KEYS:
+        target[key] += stats[key]
+
+
+class TextReport:
+    """Прежний текстовый вывод, но итоги каталога считаются только по его файлам."""
+    def __init__(self, out):
+        self.out = out
+        self._alerts = []
+
+    def _print(self, line=''):
+        self.out.write(line + '\n')
+
+    def begin(self):
+        pass
+
+    def begin_directory(self, path):
+        self._alerts = []
+        self._print("Dir: %s" % path)
+
+    def file(self, stats):
+        self._print("Analyzing file: %s" % stats['path'])
+        self._alerts.extend((alert, stats['path']) for alert in stats['alerts_without_runbook'])
+
+    def end_directory(self, stats):
+        self._print(f"Total number of alerts: {stats['total']}")
+        self._print(f"Number of alerts without runbooks: {stats['without_runbook']}")
+        self._print(f"Number of alerts with runbooks: {stats['with_runbook']}")
+        if self._alerts:
+            self._print("List of alerts without runbooks:")
+            for alert, path in self._alerts:
+                self._print(f"- {alert} (файл: {path})")
+        else:
+            self._print("All alerts have runbooks.")
+        self._print("-" * 40)
+
+    def end(self, totals):
+        self._print(f"Directories: {totals['directories']}, files: {totals['file_count']}")
+        self._print(f"Total number of alerts: {totals['total']}")
+        self._print(f"Number of alerts without runbooks: {totals['without_runbook']}")
+        self._print(f"Number of alerts with runbooks: {totals['with_runbook']}")
+
+
+class JsonReport:
+    """
+    Один JSON-документ {"directories": [{"path": ..., "files": [...], "file_count": ..., ...}], "totals": {...}},
+    по объекту файла на строку — удобно сравнивать ночные прогоны через diff.
+    """
+    def __init__(self, out):
+        self.out = out
+        self._first_directory = True
+        self._first_file = True
+
+    def begin(self):
+        self.out.write('{"directories": [')
+
+    def begin_directory(self, path):
+        self.out.write('\n' if self._first_directory else ',\n')
+        self._first_directory = False
+        self._first_file = True
+        self.out.write('{"path": %s, "files": [' % json.dumps(path))
+
+    def file(self, stats):
+        self.out.write('\n' if self._first_file else ',\n')
+        self._first_file = False
+        self.out.write(json.dumps(stats, ensure_ascii=False))
+
+    def end_directory(self, stats):
+        self.out.write('\n], %s' % json.dumps({key: stats[key] for key in ('file_count',) + STAT_KEYS})[1:])
+
+    def end(self, totals):
+        self.out.write('\n], "totals": %s}\n' % json.dumps(totals))
+
+
+class CsvReport:
+    """Строки уровня file, directory и total в одной таблице."""
+    fieldnames = ['level', 'directory', 'file', 'file_count'] + list(STAT_KEYS) + ['alerts_without_runbook']
+
+    def __init__(self, out):
+        self._writer = csv.DictWriter(out, fieldnames=self.fieldnames, extrasaction='ignore')
+
+    def begin(self):
+        self._writer.writeheader()
+
+    def begin_directory(self, path):
+        pass
+
+    def file(self, stats):
+        self._writer.writerow(dict(
+            stats,
+            level='file',
+            file=stats['path'],
+            alerts_without_runbook=';'.join(stats['alerts_without_runbook'])
+        ))
+
+    def end_directory(self, stats):
+        self._writer.writerow(dict(stats, level='directory', directory=stats['path']))
+
+    def end(self, totals):
+        self._writer.writerow(dict(totals, level='total'))
+
+
+class MarkdownReport:
+    def __init__(self, out):
+        self.out = out
+        self._alerts = []
+
+    def _print(self, line=''):
+        self.out.write(line + '\n')
+
+    def begin(self):
+        self._print("# Alerts without runbooks")
+
+    def begin_directory(self, path):
+        self._alerts = []
+        self._print()
+        self._print(f"## `{path}`")
+        self._print()
+        self._print("| File | Alerts | Without runbook | With runbook |")
+        self._print("|---|---:|---:|---:|")
+
+    def file(self, stats):
+        self._print(f"| `{stats['path']}` | {stats['total']} | {stats['without_runbook']} | {stats['with_runbook']} |")
+        self._alerts.extend((alert, stats['path']) for alert in stats['alerts_without_runbook'])
+
+    def end_directory(self, stats):
+        self._print(f"| **Total** | {stats['total']} | {stats['without_runbook']} | {stats['with_runbook']} |")
+        if self._alerts:
+            self._print()
+            for alert, path in self._alerts:
+                self._print(f"- `{alert}` (`{path}`)")
+
+    def end(self, totals):
+        self._print()
+        self._print("## Total")
+        self._print()
+        self._print("| Directories | Files | Alerts | Without runbook | With runbook |")
+        self._print("|---:|---:|---:|---:|---:|")
+        self._print(
+            f"| {totals['directories']} | {totals['file_count']} | {totals['total']} "
+            f"| {totals['without_runbook']} | {totals['with_runbook']} |"
+        )
+
+
+REPORT_FORMATS = {
+    'text': TextReport,
+    'json': JsonReport,
+    'csv': CsvReport,
+    'markdown': MarkdownReport,
+}
+
+
+def write_report(directories, report):
+    """
+    directories: итерируемое (каталог, [файлы], {файл: результат analyze_alerts}), можно генератор.
+    Возвращает общий итог.
+    """
+    totals = new_stats(directories=0, file_count=0)
+    report.begin()
+    for folder_path, file_paths, results in directories:
+        directory = new_stats(path=folder_path, file_count=len(file_paths))
+        report.begin_directory(folder_path)
+        for file_path in file_paths:
+            total, without_runbook, with_runbook, alerts = results[file_path]
+            file_stats = {
+                'path': file_path,
+                'directory': folder_path,
+                'total': total,
+                'without_runbook': without_runbook,
+                'with_runbook': with_runbook,
+                'alerts_without_runbook': [alert for alert, _ in alerts],
+            }
+            report.file(file_stats)
+            add_stats(directory, file_stats)
+        report.end_directory(directory)
+        add_stats(totals, directory)
+        totals['directories'] += 1
+        totals['file_count'] += len(file_paths)
+    report.end(totals)
+    return totals
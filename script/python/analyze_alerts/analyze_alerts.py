@@ -1,17 +1,32 @@
-import yaml
+import argparse
+import hashlib
+import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+from alerts_report import REPORT_FORMATS, write_report
+
+# C-загрузчик (libyaml) в разы быстрее чистого Python; если PyYAML собран без него — обычный SafeLoader
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
 
 ALERTS_DIR_NAME = 'alerts'
 NOT_DEFINE_RUNBOOK = [
     "https://runbook",
     "https://indriver.atlassian.net/wiki/spaces/MON/pages/1463288220/Golden+Signals+imp"
 ]
+CACHE_FILE = '.analyze_alerts_cache.json'
+# Меняется при изменении формата кэша или логики analyze_alerts — старый кэш тогда игнорируется
+CACHE_VERSION = 1
+# Если в каталоге разбирать меньше файлов, передача их в пул процессов не окупается
+MIN_FILES_FOR_POOL = 4
 
 
 def load_yaml(file_path):
     with open(file_path, 'r') as file:
-        return yaml.safe_load(file)
+        return yaml.load(file, Loader=YamlLoader)
 
 
 def analyze_alerts(data, file_path):
@@ -36,54 +51,169 @@ def analyze_alerts(data, file_path):
     return total_alerts, len(alerts_without_runbook), len(alerts_with_runbook), alerts_without_runbook
 
 
+def analyze_file(file_path):
+    """Разбор одного файла; выполняется в процессах пула, поэтому только на уровне модуля."""
+    return analyze_alerts(load_yaml(file_path), file_path)
+
+
+def file_digest(file_path):
+    with open(file_path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+class ResultCache:
+    """
+    Результаты analyze_alerts по файлам, ключ — путь, проверка — sha256 содержимого.
+    Размер и mtime сохраняются, чтобы не хешировать заново нетронутые файлы.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as file:
+                    cache = json.load(file)
+                if cache.get('version') == CACHE_VERSION:
+                    self.entries = cache['files']
+            except (OSError, ValueError):
+                pass
+
+    def get(self, file_path):
+        """Возвращает (результат или None, отпечаток файла для put)."""
+        if not self.path:
+            return None, {}
+        stat = os.stat(file_path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        entry = self.entries.get(file_path)
+        if entry and entry['signature'] == signature:
+            return self._result(entry), entry
+        digest = file_digest(file_path)
+        if entry and entry['sha256'] == digest:
+            entry['signature'] = signature
+            return self._result(entry), entry
+        return None, {'signature': signature, 'sha256': digest}
+
+    def put(self, file_path, fingerprint, result):
+        self.entries[file_path] = dict(fingerprint, result=result)
+
+    def retain(self, file_paths):
+        self.entries = {path: entry for path, entry in self.entries.items() if path in file_paths}
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump({'version': CACHE_VERSION, 'files': self.entries}, file)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _result(entry):
+        total, no_runbook, with_runbook, alerts = entry['result']
+        return total, no_runbook, with_runbook, [tuple(alert) for alert in alerts]
+
+
+class LazyPool:
+    """Пул процессов, который запускается при первой задаче: при полностью кэшированном прогоне — никогда."""
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self._executor = None
+
+    def map(self, fn, items):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.jobs)
+        return self._executor.map(fn, items, chunksize=4)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+
+
+def analyze_files(file_paths, cache, pool=None):
+    """
+    Результаты analyze_file для файлов одного каталога: из кэша для неизменённых,
+    остальные разбираются в пуле процессов (если он передан и файлов достаточно).
+    """
+    results = {}
+    to_parse = {}
+    for file_path in file_paths:
+        result, fingerprint = cache.get(file_path)
+        if result is None:
+            to_parse[file_path] = fingerprint
+        else:
+            results[file_path] = result
+
+    if pool and len(to_parse) >= MIN_FILES_FOR_POOL:
+        results.update(zip(to_parse, pool.map(analyze_file, to_parse)))
+    else:
+        results.update((file_path, analyze_file(file_path)) for file_path in to_parse)
+
+    for file_path, fingerprint in to_parse.items():
+        cache.put(file_path, fingerprint, results[file_path])
+    return results
+
+
+def iter_directory_results(folders, jobs, cache):
+    """
+    (каталог, файлы, результаты) по одному каталогу: результаты каталога разбираются
+    непосредственно перед выводом и после него не хранятся.
+    """
+    pool = LazyPool(jobs) if jobs > 1 else None
+    seen_files = set()
+    try:
+        for folder_path in folders:
+            file_paths = list_yaml_files(folder_path)
+            seen_files.update(file_paths)
+            yield folder_path, file_paths, analyze_files(file_paths, cache, pool)
+    finally:
+        if pool:
+            pool.shutdown()
+    cache.retain(seen_files)
+    cache.save()
+
+
 def find_alerts_directories(start_path):
     alerts_dirs = []
     for root, dirs, files in os.walk(start_path):
+        # В .git нет алертов, а обход его объектов — заметная часть времени на больших репозиториях
+        dirs[:] = [dir_name for dir_name in dirs if dir_name != '.git']
         for dir_name in dirs:
             if dir_name == ALERTS_DIR_NAME:
                 alerts_dirs.append(os.path.join(root, dir_name))
-    return alerts_dirs
-
-
-def main(folders: list):
-    total_alerts = 0
-    no_runbook_count = 0
-    with_runbook_count = 0
-    all_no_runbook_alerts = []
-
-    for folder_path in folders:
-        print("Dir: %s" % folder_path)
-        for filename in os.listdir(folder_path):
-            file_path = os.path.join(folder_path, filename)
-            if os.path.isfile(file_path) and filename.endswith('.yaml'):
-                print("Analyzing file: %s" % os.path.join(folder_path, file_path), )
-                data = load_yaml(file_path)
-
-                file_total_alerts, file_no_runbook_count, file_with_runbook_count, file_no_runbook_alerts = analyze_alerts(
-                    data, file_path)
-
-                total_alerts += file_total_alerts
-                no_runbook_count += file_no_runbook_count
-                with_runbook_count += file_with_runbook_count
-                all_no_runbook_alerts.extend(file_no_runbook_alerts)
-
-        print(f"Total number of alerts: {total_alerts}")
-        print(f"Number of alerts without runbooks: {no_runbook_count}")
-        print(f"Number of alerts with runbooks: {with_runbook_count}")
-
-        if all_no_runbook_alerts:
-            print("List of alerts without runbooks:")
-            for alert, path in all_no_runbook_alerts:
-                print(f"- {alert} (файл: {path})")
-        else:
-            print("All alerts have runbooks.")
-        print("-" * 40)
+    # Стабильный порядок, чтобы отчёты разных прогонов можно было сравнивать через diff
+    return sorted(alerts_dirs)
+
+
+def list_yaml_files(folder_path):
+    file_paths = []
+    for filename in sorted(os.listdir(folder_path)):
+        file_path = os.path.join(folder_path, filename)
+        if os.path.isfile(file_path) and filename.endswith('.yaml'):
+            file_paths.append(file_path)
+    return file_paths
+
+
+def main(folders: list, jobs=1, cache=None, report_format='text', out=sys.stdout):
+    directories = iter_directory_results(folders, jobs, cache or ResultCache(None))
+    return write_report(directories, REPORT_FORMATS[report_format](out))
 
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        print("Usage: python analyze_alerts.py <folder_path>")
+    parser = argparse.ArgumentParser(description="Поиск алертов без runbook_url")
+    parser.add_argument('folder_path')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="число процессов для разбора YAML (1 — без пула)")
+    parser.add_argument('--cache-file', default=CACHE_FILE,
+                        help="кэш результатов по хешу содержимого файлов")
+    parser.add_argument('--no-cache', action='store_true', help="разобрать все файлы заново, кэш не писать")
+    parser.add_argument('-f', '--format', choices=sorted(REPORT_FORMATS), default='text', help="формат отчёта")
+    parser.add_argument('-o', '--output', help="файл отчёта (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    alerts_directories = find_alerts_directories(args.folder_path)
+    cache = ResultCache(None if args.no_cache else args.cache_file)
+    if args.output:
+        with open(args.output, 'w', newline='', encoding='utf-8') as out:
+            main(alerts_directories, args.jobs, cache, args.format, out)
     else:
-        folder_path = sys.argv[1]
-        alerts_directories = find_alerts_directories(folder_path)
-        main(alerts_directories)
+        main(alerts_directories, args.jobs, cache, args.format)
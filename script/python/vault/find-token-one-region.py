@@ -1,7 +1,9 @@
 import hvac
+import threading
 import urllib.parse
 import webbrowser
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from kv_traversal import KVTraversal, kv_mounts, read_secret
 
 # Конфигурация Vault и OIDC
 VAULT_ADDRESS = "https://vault-app.prod.sa.apso1.aws.indrive.tech" #Вставь сюда ссылку на нужный регион
@@ -9,6 +11,13 @@ OIDC_CALLBACK_PORT = 8250
 OIDC_REDIRECT_URI = f"http://localhost:{OIDC_CALLBACK_PORT}/oidc/callback"
 ROLE = "editor"
 
+# Обход KV: число одновременных запросов, глубина от корня mount'а,
+# glob-фильтры путей по mount'ам (например {"payments/": ["config"]}) и остановка на первом совпадении
+MAX_WORKERS = 8
+MAX_DEPTH = 3
+PATH_FILTERS = {}
+STOP_ON_FIRST_MATCH = False
+
 SELF_CLOSING_PAGE = '''
 <!doctype html>
 <html>
@@ -79,22 +88,28 @@ def authenticate_with_oidc(client):
     client.token = auth_result['auth']['client_token']
 
 def get_mounts(client):
-    """Получаем список точек монтирования"""
-    return list(client.sys.list_mounted_secrets_engines().keys())
+    """Получаем список KV-точек монтирования (остальные движки пропускаем)"""
+    return kv_mounts(client)
 
 def search_secrets(client, mounts, search_for):
-    """Поиск значения в секретах"""
-    found_mounts = []
-    for mount in mounts:
+    """Поиск значения в секретах: обход всех путей KV в ширину пулом потоков"""
+    found_paths = []
+    found_lock = threading.Lock()
+
+    def visit(mount, version, path):
         try:
-            secret = client.secrets.kv.v2.read_secret_version(
-                path="config", mount_point=mount.rstrip('/'), raise_on_deleted_version=True
-            )
-            if search_for in str(secret['data']['data']):
-                found_mounts.append(mount)
+            data = read_secret(client, mount, version, path)
         except Exception:
-            pass  # Игнорируем ошибки доступа
-    return found_mounts
+            return  # Игнорируем ошибки доступа
+        if search_for in str(data):
+            with found_lock:
+                found_paths.append(mount + path)
+            if STOP_ON_FIRST_MATCH:
+                traversal.stop_event.set()
+
+    traversal = KVTraversal(client, max_workers=MAX_WORKERS, max_depth=MAX_DEPTH, path_filters=PATH_FILTERS)
+    traversal.walk(mounts, visit)
+    return sorted(found_paths)
 
 def main():
     search_for = input("Введите токен для поиска: ")
@@ -104,12 +119,12 @@ def main():
     authenticate_with_oidc(client)
 
     # Ищем секреты
-    found_mounts = search_secrets(client, get_mounts(client), search_for)
+    found_paths = search_secrets(client, get_mounts(client), search_for)
 
-    if found_mounts:
+    if found_paths:
         print("\nSecret find in:")
-        for mount in found_mounts:
-            print(mount)
+        for path in found_paths:
+            print(path)
     else:
         print("\nSecret not found.")
 
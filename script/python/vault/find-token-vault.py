@@ -1,7 +1,16 @@
+import getpass
 import hvac
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
 import urllib.parse
 import webbrowser
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from kv_traversal import KVTraversal, kv_mounts, read_secret
 
 # Конфигурация Vault-инстансов
 VAULT_INSTANCES = [
@@ -27,6 +36,25 @@ OIDC_CALLBACK_PORT = 8250
 OIDC_REDIRECT_URI = f"http://localhost:{OIDC_CALLBACK_PORT}/oidc/callback"
 ROLE = "editor"
 
+# Регионы сканируются параллельно, mount'ы внутри региона — пулом потоков
+MAX_PARALLEL_REGIONS = len(VAULT_INSTANCES)
+MAX_MOUNT_WORKERS = 8
+
+# Обход KV: глубина от корня mount'а, glob-фильтры путей по mount'ам
+# (например {"payments/": ["config", "app/*"], "*": ["config"]}) и остановка на первом совпадении
+MAX_DEPTH = 3
+PATH_FILTERS = {}
+STOP_ON_FIRST_MATCH = False
+
+# Токены Vault кэшируются на диске (файл доступен только владельцу) до истечения lease
+TOKEN_CACHE_PATH = os.path.expanduser("~/.cache/find-token-vault/tokens.json")
+# Токен, которому осталось жить меньше этого, пытаемся продлить
+TOKEN_RENEW_THRESHOLD_SECONDS = 15 * 60
+OIDC_LOGIN_TIMEOUT_SECONDS = 300
+
+print_lock = threading.Lock()
+token_cache_lock = threading.Lock()
+
 SELF_CLOSING_PAGE = '''
 <!doctype html>
 <html>
@@ -49,27 +77,106 @@ window.onload = function load() {
 </html>
 '''
 
-def login_oidc_get_token():
-    class HttpServ(HTTPServer):
-        def __init__(self, *args, **kwargs):
-            super().__init__(*args, **kwargs)
-            self.token = None
+class OIDCCallbackServer:
+    """
+    Один callback-сервер на весь запуск: принимает редиректы всех параллельных
+    OIDC-логинов и раздаёт code ожидающим потокам по параметру state.
+    """
+    def __init__(self, port):
+        self._pending = {}
+        self._lock = threading.Lock()
+        server = self
 
-    class AuthHandler(BaseHTTPRequestHandler):
-        def log_message(self, format, *args):
-            return
+        class AuthHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                return
+
+            def do_GET(self):
+                query = self.path.split('?', 1)[1] if '?' in self.path else ''
+                params = urllib.parse.parse_qs(query)
+                server.deliver(params.get('state', [None])[0], params.get('code', [None])[0])
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(SELF_CLOSING_PAGE.encode())
 
-        def do_GET(self):
-            params = urllib.parse.parse_qs(self.path.split('?')[1])
-            self.server.token = params.get('code', [None])[0]
-            self.send_response(200)
-            self.end_headers()
-            self.wfile.write(SELF_CLOSING_PAGE.encode())
+        self._httpd = ThreadingHTTPServer(('', port), AuthHandler)
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
 
-    server_address = ('', OIDC_CALLBACK_PORT)
-    httpd = HttpServ(server_address, AuthHandler)
-    httpd.handle_request()
-    return httpd.token
+    def expect(self, state):
+        with self._lock:
+            self._pending[state] = {"event": threading.Event(), "code": None}
+
+    def deliver(self, state, code):
+        with self._lock:
+            waiter = self._pending.get(state)
+        if waiter:
+            waiter["code"] = code
+            waiter["event"].set()
+
+    def wait(self, state, timeout):
+        with self._lock:
+            waiter = self._pending[state]
+        waiter["event"].wait(timeout)
+        with self._lock:
+            self._pending.pop(state, None)
+        if waiter["code"] is None:
+            raise TimeoutError(f"OIDC login timed out (state {state})")
+        return waiter["code"]
+
+    def shutdown(self):
+        self._httpd.shutdown()
+
+_callback_server = None
+_callback_server_lock = threading.Lock()
+
+def get_callback_server():
+    global _callback_server
+    with _callback_server_lock:
+        if _callback_server is None:
+            _callback_server = OIDCCallbackServer(OIDC_CALLBACK_PORT)
+        return _callback_server
+
+def load_token_cache():
+    try:
+        with open(TOKEN_CACHE_PATH, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_cached_token(url, token, lease_duration, renewable):
+    """Атомарно обновляет запись кэша токенов; файл и каталог доступны только владельцу."""
+    with token_cache_lock:
+        cache = load_token_cache()
+        cache[url] = {"token": token, "expires_at": time.time() + lease_duration, "renewable": renewable}
+        directory = os.path.dirname(TOKEN_CACHE_PATH)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            os.chmod(tmp_path, 0o600)
+            with os.fdopen(fd, 'w') as file:
+                json.dump(cache, file)
+            os.replace(tmp_path, TOKEN_CACHE_PATH)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+def use_cached_token(client, url):
+    """Подставляет токен из кэша, если он ещё жив; продлевает его, если lease подходит к концу."""
+    with token_cache_lock:
+        entry = load_token_cache().get(url)
+    if not entry or entry["expires_at"] <= time.time():
+        return False
+    client.token = entry["token"]
+    try:
+        ttl = client.auth.token.lookup_self()['data']['ttl']
+        if entry.get("renewable") and ttl < TOKEN_RENEW_THRESHOLD_SECONDS:
+            auth = client.auth.token.renew_self()['auth']
+            ttl = auth['lease_duration']
+        save_cached_token(url, client.token, ttl, entry.get("renewable", False))
+        return True
+    except Exception:
+        client.token = None
+        return False
 
 def authenticate_with_oidc(client):
     auth_url_response = client.auth.oidc.oidc_authorization_url_request(
@@ -77,14 +184,16 @@ def authenticate_with_oidc(client):
         redirect_uri=OIDC_REDIRECT_URI
     )
     auth_url = auth_url_response['data']['auth_url']
-    
-    webbrowser.open(auth_url)
-    token = login_oidc_get_token()
 
     params = urllib.parse.parse_qs(auth_url.split('?')[1])
     auth_url_nonce = params.get('nonce', [None])[0]
     auth_url_state = params.get('state', [None])[0]
 
+    callback_server = get_callback_server()
+    callback_server.expect(auth_url_state)
+    webbrowser.open(auth_url)
+    token = callback_server.wait(auth_url_state, OIDC_LOGIN_TIMEOUT_SECONDS)
+
     auth_result = client.auth.oidc.oidc_callback(
         code=token,
         path='oidc',
@@ -93,41 +202,178 @@ def authenticate_with_oidc(client):
     )
 
     client.token = auth_result['auth']['client_token']
+    save_cached_token(
+        client.url, client.token,
+        auth_result['auth']['lease_duration'], auth_result['auth'].get('renewable', False)
+    )
+
+def login(client):
+    if not use_cached_token(client, client.url):
+        authenticate_with_oidc(client)
 
 def get_mounts(client):
     try:
-        return list(client.sys.list_mounted_secrets_engines().keys())
+        return kv_mounts(client)
     except Exception:
         return []
 
-def search_secrets(client, mounts, search_for):
-    found_mounts = []
-    for mount in mounts:
+def search_secrets(client, mounts, search_for, on_found=None, stop_event=None):
+    found_paths = []
+    found_lock = threading.Lock()
+
+    def visit(mount, version, path):
         try:
-            secret = client.secrets.kv.v2.read_secret_version(
-                path="config", mount_point=mount.rstrip('/'), raise_on_deleted_version=True
-            )
-            if search_for in str(secret['data']['data']):
-                found_mounts.append(mount)
+            data = read_secret(client, mount, version, path)
         except Exception:
-            pass
-    return found_mounts
+            return
+        if search_for in str(data):
+            with found_lock:
+                found_paths.append(mount + path)
+            if on_found:
+                on_found(mount + path)
+            if STOP_ON_FIRST_MATCH and stop_event:
+                stop_event.set()
 
-def main():
-    search_for = input("Enter token to search: ")
-    
-    for vault in VAULT_INSTANCES:
-        client = hvac.Client(url=vault["url"])
-        
+    traversal = KVTraversal(
+        client, max_workers=MAX_MOUNT_WORKERS, max_depth=MAX_DEPTH,
+        path_filters=PATH_FILTERS, stop_event=stop_event
+    )
+    traversal.walk(mounts, visit)
+    return sorted(found_paths)
+
+def report(message):
+    with print_lock:
+        print(message, flush=True)
+
+def search_region(vault, search_for, stop_event):
+    started = time.monotonic()
+    client = hvac.Client(url=vault["url"])
+    error = None
+    try:
+        login(client)
+        mounts = get_mounts(client)
+        found_paths = search_secrets(
+            client, mounts, search_for,
+            on_found=lambda path: report(f"Secret find in {vault['url']}: {path}"),
+            stop_event=stop_event
+        )
+    except Exception as e:
+        found_paths = []
+        error = e
+    return {
+        "vault": vault,
+        "found_paths": found_paths,
+        "seconds": time.monotonic() - started,
+        "error": error,
+    }
+
+def index_region(vault, index, index_lock):
+    """
+    Обновляет записи индекса по региону: секрет KV v2 перечитывается, только если его версия
+    в метаданных отличается от проиндексированной (у KV v1 версий нет — читается всегда).
+    Записи удаляются, только если секрета точно нет: ошибка чтения секрета или перечисления
+    каталога оставляет прежние записи, ошибка получения списка mount'ов — весь регион.
+    """
+    started = time.monotonic()
+    client = hvac.Client(url=vault["url"])
+    stats = {"vault": vault, "updated": 0, "unchanged": 0, "error": None}
+    live_keys = set()
+
+    def visit(mount, version, path):
+        key = index.entry_key(vault["name"], mount, path)
+        secret_version = None
+        # Секрет есть в листинге: прежняя запись сохраняется, даже если его не удастся прочитать
+        with index_lock:
+            live_keys.add(key)
         try:
-            authenticate_with_oidc(client)
-            found_mounts = search_secrets(client, get_mounts(client), search_for)
+            if version == '2':
+                metadata = client.secrets.kv.v2.read_secret_metadata(path=path, mount_point=mount.rstrip('/'))
+                secret_version = metadata['data']['current_version']
+                with index_lock:
+                    if index.version_of(key) == secret_version:
+                        stats["unchanged"] += 1
+                        return
+            data = read_secret(client, mount, version, path)
         except Exception:
-            found_mounts = []
+            return
+        with index_lock:
+            index.put(key, secret_version, data)
+            stats["updated"] += 1
+
+    try:
+        login(client)
+        traversal = KVTraversal(client, max_workers=MAX_MOUNT_WORKERS, max_depth=MAX_DEPTH, path_filters=PATH_FILTERS)
+        # Без get_mounts: пустой список mount'ов из-за ошибки стёр бы весь регион
+        traversal.walk(kv_mounts(client), visit)
+        with index_lock:
+            for mount, path in traversal.failed_listings:
+                prefix = index.entry_key(vault["name"], mount, path)
+                live_keys.update(key for key in index.entries if key.startswith(prefix))
+            index.retain(f"{vault['name']}|", live_keys)
+    except Exception as e:
+        stats["error"] = e
+    stats["seconds"] = time.monotonic() - started
+    return stats
+
+def build_index():
+    from token_index import TokenIndex
+
+    index = TokenIndex(getpass.getpass("Index passphrase: "))
+    index_lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_REGIONS) as executor:
+        results = list(executor.map(lambda vault: index_region(vault, index, index_lock), VAULT_INSTANCES))
+    index.save()
+
+    for result in results:
+        status = f"error: {result['error']}" if result["error"] else f"updated {result['updated']}, unchanged {result['unchanged']}"
+        print(f"{result['vault']['name']:<8} {result['seconds']:7.1f}s  {status}")
+    print(f"Index saved: {index.path} ({len(index.entries)} secrets)")
+
+def lookup_index():
+    from token_index import TokenIndex
+
+    index = TokenIndex(getpass.getpass("Index passphrase: "))
+    if not index.entries:
+        print("Index is empty, run: python3 find-token-vault.py index")
+        return
+    while True:
+        search_for = getpass.getpass("Enter token to look up (empty to exit): ")
+        if not search_for:
+            break
+        started = time.perf_counter()
+        locations = index.lookup(search_for)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if not locations:
+            print(f"not found ({elapsed_ms:.1f} ms)")
+        for vault_name, mount, path, field in locations:
+            print(f"{vault_name}: {mount}{path} [{field}]")
+
+def main():
+    search_for = input("Enter token to search: ")
+    started = time.monotonic()
+
+    # Общий для всех регионов: при STOP_ON_FIRST_MATCH первое совпадение останавливает обход везде
+    stop_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL_REGIONS) as executor:
+        results = list(executor.map(lambda vault: search_region(vault, search_for, stop_event), VAULT_INSTANCES))
 
-        print(f"\nSecret find in {vault['url']}:" if found_mounts else f"\nSecret find in {vault['name']}:\nnot found")
-        for mount in found_mounts:
-            print(mount)
+    print("\nSummary:")
+    for result in results:
+        vault = result["vault"]
+        status = f"error: {result['error']}" if result["error"] else f"found {len(result['found_paths'])}"
+        print(f"{vault['name']:<8} {result['seconds']:7.1f}s  {status}  {vault['url']}")
+        for path in result["found_paths"]:
+            print(f"    {path}")
+    print(f"Total: {time.monotonic() - started:.1f}s")
+    if _callback_server is not None:
+        _callback_server.shutdown()
 
 if __name__ == "__main__":
-    main()
+    # index — построить/обновить локальный индекс, lookup — искать по индексу без обращения к Vault
+    command = sys.argv[1] if len(sys.argv) > 1 else "search"
+    if command == "index":
+        build_index()
+    elif command == "lookup":
+        lookup_index()
+    else:
+        main()
@@ -0,0 +1,105 @@
+import fnmatch
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# По умолчанию обходим не глубже трёх уровней вложенности от корня mount'а
+DEFAULT_MAX_DEPTH = 3
+# Секрет, который читается, если корень mount'а нельзя перечислить (есть read, но нет list)
+ROOT_FALLBACK_PATH = 'config'
+
+
+def kv_mounts(client):
+    """
+    Возвращает [(mount, версия KV)] только для KV-движков; остальные (pki, transit, ...)
+    пропускаются — в них нечего читать через kv API.
+    """
+    response = client.sys.list_mounted_secrets_engines()
+    engines = response.get('data', response)
+    mounts = []
+    for mount, engine in engines.items():
+        if not isinstance(engine, dict) or engine.get('type') not in ('kv', 'generic'):
+            continue
+        version = str((engine.get('options') or {}).get('version', '1'))
+        mounts.append((mount, version))
+    return sorted(mounts)
+
+
+def list_keys(client, mount, version, path):
+    mount_point = mount.rstrip('/')
+    if version == '2':
+        response = client.secrets.kv.v2.list_secrets(path=path, mount_point=mount_point)
+    else:
+        response = client.secrets.kv.v1.list_secrets(path=path, mount_point=mount_point)
+    return response['data']['keys']
+
+
+def read_secret(client, mount, version, path):
+    mount_point = mount.rstrip('/')
+    if version == '2':
+        return client.secrets.kv.v2.read_secret_version(
+            path=path, mount_point=mount_point, raise_on_deleted_version=True
+        )['data']['data']
+    return client.secrets.kv.v1.read_secret(path=path, mount_point=mount_point)['data']
+
+
+class KVTraversal:
+    """
+    Обход KV-путей в ширину с ограниченным числом одновременных запросов.
+
+    path_filters: {mount: [glob-шаблоны пути]} — секреты вне шаблонов не посещаются;
+    для mount'ов без записи (и ключа "*") посещается всё. stop_event позволяет
+    прекратить обход досрочно (например, после первого совпадения).
+    failed_listings — [(mount, path)] каталогов, которые не удалось перечислить при последнем обходе:
+    их содержимое неизвестно, а не пусто.
+    """
+    def __init__(self, client, max_workers=8, max_depth=DEFAULT_MAX_DEPTH, path_filters=None, stop_event=None):
+        self.client = client
+        self.max_workers = max_workers
+        self.max_depth = max_depth
+        self.path_filters = path_filters or {}
+        self.stop_event = stop_event or threading.Event()
+        self.failed_listings = []
+
+    def _wanted(self, mount, path):
+        patterns = self.path_filters.get(mount, self.path_filters.get('*'))
+        return not patterns or any(fnmatch.fnmatch(path, pattern) for pattern in patterns)
+
+    def walk(self, mounts, visit):
+        """
+        Вызывает visit(mount, version, path) для каждого секрета (в потоках пула).
+        Ошибки доступа к отдельным каталогам и секретам пропускаются; если не удалось
+        перечислить корень mount'а, читается хотя бы <mount>/config.
+        """
+        self.failed_listings = []
+        frontier = deque(('list', mount, version, '', 0) for mount, version in mounts)
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while (frontier or in_flight) and not self.stop_event.is_set():
+                while frontier and len(in_flight) < self.max_workers:
+                    task = frontier.popleft()
+                    kind, mount, version, path, _ = task
+                    if kind == 'list':
+                        future = executor.submit(list_keys, self.client, mount, version, path)
+                    else:
+                        future = executor.submit(visit, mount, version, path)
+                    in_flight[future] = task
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, mount, version, path, depth = in_flight.pop(future)
+                    if kind != 'list':
+                        continue
+                    if future.exception() is not None:
+                        self.failed_listings.append((mount, path))
+                        if not path and self._wanted(mount, ROOT_FALLBACK_PATH):
+                            frontier.append(('visit', mount, version, ROOT_FALLBACK_PATH, depth))
+                        continue
+                    for key in future.result():
+                        child = path + key
+                        if key.endswith('/'):
+                            if depth + 1 < self.max_depth:
+                                frontier.append(('list', mount, version, child, depth + 1))
+                        elif self._wanted(mount, child):
+                            frontier.append(('visit', mount, version, child, depth))
+            for future in in_flight:
+                future.cancel()
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from common.http_client import HostRateLimiter
+
+SLACK_API = "https://slack.com/api"
+
+# Лимиты Slack Web API по тарифам (запросов в секунду на метод)
+SLACK_TIER_RATES = {
+    "conversations.list": 20 / 60,     # Tier 2
+    "conversations.archive": 20 / 60,  # Tier 2
+    "conversations.info": 50 / 60,     # Tier 3
+    "conversations.join": 50 / 60,     # Tier 3
+}
+
+# Ошибки, после которых канал считается уже заархивированным
+ALREADY_ARCHIVED_ERRORS = {"already_archived", "is_archived"}
+
+
+class SlackMethodRateLimiter(HostRateLimiter):
+    """Отдельная корзина на каждый метод Slack API: у методов разные тарифы."""
+    def __init__(self, rates_per_second=None, default_rate=20 / 60):
+        super().__init__(rates_per_second or SLACK_TIER_RATES, default_rate)
+
+    def _key(self, url):
+        return urlparse(url).path.rsplit('/', 1)[-1]
+
+
+class ArchiveJournal:
+    """
+    Журнал архивации (JSON Lines): шаги join/archive по каналам. При повторном запуске
+    после сбоя уже заархивированные каналы пропускаются, а для вступивших не повторяется join.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.joined = set()
+        self.archived = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Недописанная строка при аварийном завершении
+                        continue
+                    if entry["step"] == "joined":
+                        self.joined.add(entry["channel"])
+                    elif entry["step"] == "archived":
+                        self.archived.add(entry["channel"])
+
+    def record(self, step, channel, incident, error=None):
+        entry = {"ts": time.time(), "step": step, "channel": channel, "incident": incident}
+        if error:
+            entry["error"] = error
+        with self._lock:
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a') as file:
+                file.write(json.dumps(entry) + "\n")
+            if step == "joined":
+                self.joined.add(channel)
+            elif step == "archived":
+                self.archived.add(channel)
+
+    def clear(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.joined = set()
+            self.archived = set()
+
+
+class ArchivePipeline:
+    """
+    Архивация каналов: join → archive в пуле из workers потоков. Частоту запросов ограничивает
+    rate limiter HTTP-клиента (по тарифам Slack), 429 с Retry-After повторяет сам клиент.
+    """
+    def __init__(self, http, headers, journal, workers=4):
+        self.http = http
+        self.headers = headers
+        self.journal = journal
+        self.workers = workers
+
+    def plan(self, channels: dict) -> dict:
+        """Каналы (инцидент → канал), которые ещё предстоит заархивировать."""
+        return {incident: channel for incident, channel in channels.items() if channel not in self.journal.archived}
+
+    def _call(self, method, channel):
+        response = self.http.post(f"{SLACK_API}/{method}", headers=self.headers, json={"channel": channel})
+        try:
+            return response.json()
+        except ValueError:
+            return {"ok": False, "error": f"http_{response.status_code}"}
+
+    def archive(self, incident, channel) -> bool:
+        if channel not in self.journal.joined:
+            join_data = self._call("conversations.join", channel)
+            if join_data.get("error") in ALREADY_ARCHIVED_ERRORS:
+                self.journal.record("archived", channel, incident)
+                logging.info(f"Канал {channel} (Инцидент {incident}) уже заархивирован.")
+                return True
+            if not join_data.get("ok"):
+                self.journal.record("failed", channel, incident, join_data.get("error"))
+                logging.error(f"Ошибка вступления в канал {channel}: {join_data.get('error')}")
+                return False
+            self.journal.record("joined", channel, incident)
+            logging.info(f"Бот вступил в канал {channel}.")
+
+        archive_data = self._call("conversations.archive", channel)
+        if archive_data.get("ok") or archive_data.get("error") in ALREADY_ARCHIVED_ERRORS:
+            self.journal.record("archived", channel, incident)
+            logging.info(f"Канал {channel} (Инцидент {incident}) заархивирован!")
+            return True
+        self.journal.record("failed", channel, incident, archive_data.get("error"))
+        logging.error(f"Ошибка архивирования канала {channel}: {archive_data.get('error')}")
+        return False
+
+    def run(self, channels: dict) -> set:
+        """Архивирует каналы плана; возвращает все заархивированные каналы (включая прошлые по журналу)."""
+        plan = self.plan(channels)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = list(executor.map(lambda item: self.archive(*item), plan.items()))
+        logging.info(f"Заархивировано каналов: {sum(results)} из {len(plan)}.")
+        return set(self.journal.archived)
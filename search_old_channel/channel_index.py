@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import tempfile
+import time
+
+SLACK_API = "https://slack.com/api"
+LIST_PAGE_LIMIT = 1000  # Максимум conversations.list за страницу
+
+
+class ChannelIndex:
+    """
+    Индекс каналов Slack (ID → имя, признак архивации), построенный постранично через
+    conversations.list вместе с архивными каналами. Кэшируется на диске на ttl_seconds,
+    чтобы проверка тысяч каналов не требовала conversations.info на каждый.
+    """
+    def __init__(self, http, headers, cache_path, ttl_seconds=6 * 3600, channel_types="public_channel"):
+        self.http = http
+        self.headers = headers
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self.channel_types = channel_types
+        self.channels = {}
+        self.built_at = 0.0
+
+    def load(self):
+        if not self._load_cache():
+            self.refresh()
+        return self
+
+    def _load_cache(self):
+        if not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path, 'r') as file:
+                cache = json.load(file)
+        except (OSError, ValueError):
+            return False
+        age = time.time() - cache.get("built_at", 0)
+        if age > self.ttl_seconds or cache.get("channel_types") != self.channel_types:
+            return False
+        self.channels = cache["channels"]
+        self.built_at = cache["built_at"]
+        logging.info(f"Индекс каналов Slack из кэша ({len(self.channels)} каналов, возраст {age / 60:.0f} мин).")
+        return True
+
+    def refresh(self):
+        channels = {}
+        cursor = None
+        pages = 0
+        while True:
+            params = {"types": self.channel_types, "exclude_archived": "false", "limit": LIST_PAGE_LIMIT}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.http.get(f"{SLACK_API}/conversations.list", headers=self.headers, params=params)
+            data = response.json()
+            if not data.get("ok"):
+                raise RuntimeError(f"Ошибка conversations.list: {data.get('error', response.status_code)}")
+            pages += 1
+            for channel in data.get("channels", []):
+                channels[channel["id"]] = [channel["name"], channel.get("is_archived", False)]
+            cursor = data.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                break
+        self.channels = channels
+        self.built_at = time.time()
+        logging.info(f"Индекс каналов Slack построен: {len(channels)} каналов за {pages} страниц.")
+        self.save()
+
+    def save(self):
+        """Сохраняет индекс с исходным временем построения: дозапросы и отметки не продлевают TTL."""
+        directory = os.path.dirname(self.cache_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump({"built_at": self.built_at, "channel_types": self.channel_types, "channels": self.channels}, file)
+            os.replace(tmp_path, self.cache_path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def get(self, channel_id):
+        """
+        (имя, заархивирован) или None, если канал недоступен. Каналы, которых нет в индексе
+        (созданы после его построения или другого типа), запрашиваются через conversations.info.
+        """
+        channel = self.channels.get(channel_id)
+        if channel is not None:
+            return tuple(channel)
+        response = self.http.get(f"{SLACK_API}/conversations.info", headers=self.headers, params={"channel": channel_id})
+        if response.status_code != 200:
+            logging.error(f"Ошибка получения информации о канале {channel_id}: {response.text}")
+            return None
+        data = response.json()
+        if not data.get("ok"):
+            return None
+        channel = [data["channel"]["name"], data["channel"].get("is_archived", False)]
+        self.channels[channel_id] = channel
+        return tuple(channel)
+
+    def mark_archived(self, channel_id):
+        if channel_id in self.channels:
+            self.channels[channel_id][1] = True
@@ -1,7 +1,18 @@
 import requests
+import json
 import re
 import os
+import sys
 import logging
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.http_client import HttpClient
+from archive_pipeline import ArchiveJournal, ArchivePipeline, SlackMethodRateLimiter
+from channel_index import ChannelIndex
+from sweep_state import SweepState
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -15,12 +26,34 @@ SLACK_TOKEN = os.getenv("SLACK_TOKEN")
 PROJECT_KEY = "INCIDENT"
 SLACK_FIELD = "customfield_13454"
 MAX_RESULTS = 100  # Ограничение Jira API
+MAX_JIRA_WORKERS = 8  # Страниц поиска Jira, запрашиваемых одновременно
+
+# Индекс каналов Slack из conversations.list, кэшируется локально
+CHANNEL_INDEX_PATH = os.getenv("CHANNEL_INDEX_PATH", os.path.expanduser("~/.cache/search_old_channel/channels.json"))
+CHANNEL_INDEX_TTL_SECONDS = int(os.getenv("CHANNEL_INDEX_TTL_SECONDS", 6 * 3600))
+
+# Состояние между запусками: обычный запуск смотрит только тикеты, обновлённые с прошлого,
+# раз в FULL_SYNC_DAYS (или при FULL_SYNC=1) — полная сверка за год
+SWEEP_STATE_PATH = os.getenv("SWEEP_STATE_PATH", os.path.expanduser("~/.cache/search_old_channel/sweep_state.json"))
+FULL_SYNC_DAYS = int(os.getenv("FULL_SYNC_DAYS", 30))
+WATERMARK_OVERLAP_MINUTES = 10  # Запас на расхождение часов и задержку индексации Jira
+
+# Архивация: параллельно ARCHIVE_WORKERS каналов в пределах лимитов Slack, шаги пишутся в журнал,
+# поэтому повторный запуск после сбоя продолжает с места остановки.
+# DRY_RUN=1 (или --dry-run) — только вывести план архивации в stdout
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", 4))
+ARCHIVE_JOURNAL_PATH = os.getenv("ARCHIVE_JOURNAL_PATH", os.path.expanduser("~/.cache/search_old_channel/archive_journal.jsonl"))
+DRY_RUN = os.getenv("DRY_RUN") == "1" or "--dry-run" in sys.argv[1:]
 
 # Проверка переменных окружения
 if not JIRA_API_TOKEN or not JIRA_USER_EMAIL or not SLACK_TOKEN:
     logging.error("Отсутствуют необходимые переменные окружения!")
     exit(1)
 
+http = HttpClient(timeout=30, pool_maxsize=MAX_JIRA_WORKERS)
+# Отдельный клиент для Slack: лимиты считаются по методам API, а не по хосту
+slack_http = HttpClient(timeout=30, pool_maxsize=ARCHIVE_WORKERS, rate_limiter=SlackMethodRateLimiter())
+
 # Авторизация
 auth = requests.auth.HTTPBasicAuth(JIRA_USER_EMAIL, JIRA_API_TOKEN)
 headers_jira = {"Accept": "application/json"}
@@ -29,94 +62,140 @@ headers_slack = {
     "Content-Type": "application/json"
 }
 
-# JQL-запрос к Jira
+sweep_state = SweepState(SWEEP_STATE_PATH).load()
+run_started_at = time.time()
+full_sync = os.getenv("FULL_SYNC") == "1" or sweep_state.full_sync_due(FULL_SYNC_DAYS)
+
+# JQL-запрос к Jira; стабильная сортировка нужна, чтобы параллельные страницы startAt не пересекались.
+# Время обновления задаётся относительно (-Nm), чтобы не зависеть от часового пояса профиля Jira
 JQL_QUERY = f'project={PROJECT_KEY} AND status="Closed" AND created >= -365d'
+if full_sync:
+    sweep_state.start_full_sync()
+    logging.info("Полная сверка закрытых инцидентов за год.")
+else:
+    minutes_since = math.ceil((run_started_at - sweep_state.watermark) / 60) + WATERMARK_OVERLAP_MINUTES
+    JQL_QUERY += f' AND updated >= -{minutes_since}m'
+    logging.info(f"Инкрементальный проход: инциденты, обновлённые за последние {minutes_since} мин.")
+
+# Каналы, заархивированные прерванным запуском, уже не нужно проверять
+archive_journal = ArchiveJournal(ARCHIVE_JOURNAL_PATH)
+sweep_state.archived |= archive_journal.archived
+JQL_QUERY += ' ORDER BY created ASC'
 API_ENDPOINT = f"{JIRA_URL}/rest/api/3/search"
 
 # Получаем общее количество инцидентов
 params = {"jql": JQL_QUERY, "maxResults": 0}
-total_response = requests.get(API_ENDPOINT, headers=headers_jira, params=params, auth=auth)
+total_response = http.get(API_ENDPOINT, headers=headers_jira, params=params, auth=auth)
+if total_response.status_code != 200:
+    logging.error(f"Ошибка запроса к Jira: {total_response.status_code} {total_response.text}")
+    exit(1)
 total_issues = total_response.json().get("total", 0)
 logging.info(f"Общее количество закрытых инцидентов: {total_issues}")
 
-start_at = 0
-all_channels = {}
+# Страницы Jira, которые не удалось получить: watermark тогда не сдвигается
+failed_pages = []
 
-while start_at < total_issues:
-    params = {"jql": JQL_QUERY, "fields": ["key", SLACK_FIELD], "startAt": start_at, "maxResults": MAX_RESULTS}
-    response = requests.get(API_ENDPOINT, headers=headers_jira, params=params, auth=auth)
-    
+CHANNEL_LINK_PATTERN = re.compile(r"(?:archives|huddle/[A-Z0-9]+|slack://(?:channel\?team=[A-Z0-9]+&id=)?|app_redirect\?channel=)([A-Z0-9]+)")
+
+
+def fetch_issue_page(start_at):
+    # Только поле со ссылкой на Slack: key приходит всегда, остальные поля не нужны
+    params = {"jql": JQL_QUERY, "fields": SLACK_FIELD, "startAt": start_at, "maxResults": MAX_RESULTS}
+    response = http.get(API_ENDPOINT, headers=headers_jira, params=params, auth=auth)
     if response.status_code != 200:
-        logging.error(f"Ошибка запроса к Jira: {response.status_code} {response.text}")
-        break
-    
-    data = response.json()
-    issues = data.get("issues", [])
-    logging.info(f"Обработано инцидентов: {start_at + len(issues)} / {total_issues}")
-    
+        logging.error(f"Ошибка запроса к Jira (startAt={start_at}): {response.status_code} {response.text}")
+        failed_pages.append(start_at)
+        return []
+    return response.json().get("issues", [])
+
+
+def iter_issues(total_issues):
+    """
+    Число страниц известно заранее, поэтому они запрашиваются параллельно;
+    задачи отдаются по мере прихода страниц, не дожидаясь остальных.
+    """
+    processed = 0
+    with ThreadPoolExecutor(max_workers=MAX_JIRA_WORKERS) as executor:
+        futures = [executor.submit(fetch_issue_page, start_at) for start_at in range(0, total_issues, MAX_RESULTS)]
+        for future in as_completed(futures):
+            issues = future.result()
+            processed += len(issues)
+            logging.info(f"Обработано инцидентов: {processed} / {total_issues}")
+            yield from issues
+
+
+def iter_channels(issues):
+    """(тикет, ID канала) для задач со ссылкой на Slack."""
     for issue in issues:
         ticket_id = issue["key"]
         slack_link = issue["fields"].get(SLACK_FIELD, "")
         if not slack_link:
             logging.warning(f"Инцидент {ticket_id} не имеет ссылки на Slack.")
             continue
-        
-        match = re.search(r"(?:archives|huddle/[A-Z0-9]+|slack://(?:channel\?team=[A-Z0-9]+&id=)?|app_redirect\?channel=)([A-Z0-9]+)", slack_link)
+
+        match = CHANNEL_LINK_PATTERN.search(slack_link)
         if match:
-            channel_id = match.group(1)
-            all_channels[ticket_id] = channel_id
+            yield ticket_id, match.group(1)
         else:
             logging.warning(f"Не удалось извлечь Channel ID для {ticket_id}: {slack_link}")
-    
-    start_at += MAX_RESULTS
+
 
 incident_pattern = re.compile(r"^incident_[a-zA-Z0-9_-]+_\d{4}-\d{2}-\d{2}_\d+$")
-filtered_channels = {}
+# Каналы, которые не удалось заархивировать в прошлый раз, повторяются без запроса к Jira
+filtered_channels = dict(sweep_state.pending)
 
-for incident, channel in all_channels.items():
-    channel_info_response = requests.get("https://slack.com/api/conversations.info", headers=headers_slack, params={"channel": channel})
-    if channel_info_response.status_code != 200:
-        logging.error(f"Ошибка получения информации о канале {channel}: {channel_info_response.text}")
+channel_index = ChannelIndex(slack_http, headers_slack, CHANNEL_INDEX_PATH, CHANNEL_INDEX_TTL_SECONDS).load()
+
+for incident, channel in iter_channels(iter_issues(total_issues)):
+    if sweep_state.is_settled(channel):
         continue
-    
-    channel_info = channel_info_response.json()
-    if channel_info.get("ok"):
-        channel_name = channel_info["channel"]["name"]
-        is_archived = channel_info["channel"].get("is_archived", False)
-        
-        if is_archived:
-            logging.info(f"Канал {channel} (Инцидент {incident}) уже заархивирован.")
-            continue
-        
-        if incident_pattern.match(channel_name):
-            filtered_channels[incident] = channel
 
-logging.info(f"Найдено {len(filtered_channels)} каналов для архивирования.")
+    channel_info = channel_index.get(channel)
+    if channel_info is None:
+        continue
 
-def join_channel(channel):
-    join_response = requests.post("https://slack.com/api/conversations.join", headers=headers_slack, json={"channel": channel})
-    join_data = join_response.json()
-    if join_data.get("ok"):
-        logging.info(f"Бот вступил в канал {channel}.")
-    else:
-        logging.error(f"Ошибка вступления в канал {channel}: {join_data.get('error')}")
-
-def archive_channel(channel):
-    join_channel(channel)
-    archive_response = requests.post("https://slack.com/api/conversations.archive", headers=headers_slack, json={"channel": channel})
-    archive_data = archive_response.json()
-    if archive_data.get("ok"):
-        logging.info(f"Канал {channel} заархивирован!")
+    channel_name, is_archived = channel_info
+    if is_archived:
+        sweep_state.archived.add(channel)
+        logging.info(f"Канал {channel} (Инцидент {incident}) уже заархивирован.")
+        continue
+
+    if incident_pattern.match(channel_name):
+        filtered_channels[incident] = channel
     else:
-        logging.error(f"Ошибка архивирования канала {channel}: {archive_data.get('error')}")
+        sweep_state.not_matching.add(channel)
+
+logging.info(f"Найдено {len(filtered_channels)} каналов для архивирования.")
+
+archive_pipeline = ArchivePipeline(slack_http, headers_slack, archive_journal, ARCHIVE_WORKERS)
+archive_plan = archive_pipeline.plan(filtered_channels)
 
-if filtered_channels:
+if not archive_plan:
+    logging.info("Не найдено каналов для архивирования.")
+elif DRY_RUN:
+    logging.info(f"Dry run: {len(archive_plan)} каналов будут заархивированы, план выведен в stdout.")
+    print(json.dumps(archive_plan, indent=2, sort_keys=True))
+else:
     logging.info("Будут заархивированы следующие каналы:")
-    for incident, channel in filtered_channels.items():
+    for incident, channel in archive_plan.items():
         logging.info(f"Инцидент {incident} → Канал {channel}")
-    
-    for incident, channel in filtered_channels.items():
-        logging.info(f"Канал {channel} (Инцидент {incident}) будет заархивирован.")
-        archive_channel(channel)
+    archive_pipeline.run(archive_plan)
+
+for channel in archive_journal.archived:
+    channel_index.mark_archived(channel)
+    sweep_state.archived.add(channel)
+
+channel_index.save()
+sweep_state.pending = {
+    incident: channel for incident, channel in filtered_channels.items() if channel not in sweep_state.archived
+}
+if failed_pages:
+    logging.warning(f"Не получено страниц Jira: {len(failed_pages)}, следующий запуск повторит этот интервал.")
 else:
-    logging.info("Не найдено каналов для архивирования.")
+    sweep_state.complete(run_started_at, full_sync)
+if not DRY_RUN:
+    sweep_state.save()
+    # Результаты журнала теперь в состоянии прохода
+    archive_journal.clear()
+http.log_metrics()
+slack_http.log_metrics()
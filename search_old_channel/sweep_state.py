@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import time
+
+STATE_FORMAT_VERSION = 1
+
+
+class SweepState:
+    """
+    Состояние между запусками:
+    - watermark — время начала последнего успешного прохода, с него смотрятся обновлённые тикеты Jira;
+    - archived / not_matching — каналы, уже заархивированные или с именем не по шаблону инцидента;
+    - pending — найденные, но не заархивированные каналы (инцидент → канал), повторяются в следующем запуске.
+    Раз в full_sync_days делается полный проход.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.watermark = None
+        self.last_full_sync = None
+        self.archived = set()
+        self.not_matching = set()
+        self.pending = {}
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, 'r') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            return self
+        if state.get("format") != STATE_FORMAT_VERSION:
+            return self
+        self.watermark = state.get("watermark")
+        self.last_full_sync = state.get("last_full_sync")
+        self.archived = set(state.get("archived", []))
+        self.not_matching = set(state.get("not_matching", []))
+        self.pending = state.get("pending", {})
+        return self
+
+    def full_sync_due(self, full_sync_days):
+        return (
+            self.watermark is None
+            or self.last_full_sync is None
+            or time.time() - self.last_full_sync >= full_sync_days * 86400
+        )
+
+    def is_settled(self, channel_id):
+        """Канал уже не требует проверки: заархивирован или не инцидентный."""
+        return channel_id in self.archived or channel_id in self.not_matching
+
+    def start_full_sync(self):
+        # Полный проход перепроверяет всё, поэтому множества собираются заново
+        self.archived = set()
+        self.not_matching = set()
+
+    def complete(self, started_at, full_sync):
+        self.watermark = started_at
+        if full_sync:
+            self.last_full_sync = started_at
+
+    def save(self):
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as file:
+                json.dump({
+                    "format": STATE_FORMAT_VERSION,
+                    "watermark": self.watermark,
+                    "last_full_sync": self.last_full_sync,
+                    "archived": sorted(self.archived),
+                    "not_matching": sorted(self.not_matching),
+                    "pending": self.pending,
+                }, file)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise